@@ -19,9 +19,19 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import datetime
 import json
+import os
+import tempfile
+import threading
 import uuid
 import tasklib.task as tlib
+from tarenalib.reader import DataFileReader, UnsupportedFormat
+from tarenalib.changelog import ChangeLog, change_log_file
+from tarenalib.index import task_index, data_signature
+from tarenalib.merkle import MerkleTree, digest
+from tarenalib.remote import RemoteTaskWarrior, is_remote
+from tarenalib.runner import RunnerTaskWarrior
 
 uda_config_list = [
     ['uda.Arena.type', 'string'],
@@ -30,6 +40,7 @@ uda_config_list = [
     ['uda.ArenaTaskID.label', 'ArenaTaskID'],
 ]
 
+
 tw_attrs_editable = [
     'depends',
     'description',
@@ -62,6 +73,117 @@ tw_attrs_read_only = [
 ]
 
 
+def canonical_value(field, value):
+    """ Returns the raw value of an editable field in a form that is equal
+        for equal values, or None if the field is empty.
+    """
+    if value in [None, '', []]:
+        return None
+    if field in ['depends', 'tags'] and isinstance(value, str):
+        value = value.split(',')
+    if field == 'depends':
+        value = sorted(value)
+    elif field == 'imask':
+        value = float(value)
+    return value
+
+
+def content_hash(data):
+    """ Returns a hash of the editable fields of the raw task data, which
+        is equal for two tasks exactly if they have no different fields.
+    """
+    canonical = {}
+    for field in tw_attrs_editable:
+        value = canonical_value(field, data.get(field))
+        if value is not None:
+            canonical[field] = value
+    return digest([json.dumps(canonical, sort_keys=True)])
+
+
+def hashes_of(data_list):
+    """ Returns the content hashes of the raw task data by arena name and
+        ArenaTaskID, as stored in the task index.
+    """
+    hashes = {}
+    for data in data_list:
+        if data.get('ArenaTaskID'):
+            hashes.setdefault(data.get('Arena'), {})[
+                str(data['ArenaTaskID'])] = content_hash(data)
+    return hashes
+
+
+class TaskRecord(object):
+    """ A compact, read-only view of the raw data of an arena task, holding
+        just what is needed to diff it against its counterpart.
+    """
+
+    __slots__ = ['ArenaTaskID', 'uuid', 'modified'] + tw_attrs_editable
+
+    def __init__(self, data):
+        init = super(TaskRecord, self).__setattr__
+        init('ArenaTaskID', data.get('ArenaTaskID'))
+        init('uuid', data.get('uuid'))
+        init('modified', data.get('modified') or data.get('entry'))
+        for field in tw_attrs_editable:
+            init(field, canonical_value(field, data.get(field)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TaskRecord is read-only')
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def last_modified(self):
+        if not self.modified:
+            return None
+        return datetime.datetime.strptime(
+            self.modified, tlib.DATE_FORMAT).replace(
+            tzinfo=datetime.timezone.utc).astimezone()
+
+    def different_fields(self, other):
+        return [field for field in tw_attrs_editable
+                if getattr(self, field) != getattr(other, field)]
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.ArenaTaskID == other.ArenaTaskID
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return str({'ArenaTaskID': self.ArenaTaskID, 'uuid': self.uuid})
+
+
+class ArenaTask(tlib.Task):
+    """ A tasklib Task that caches the content hash of its editable fields
+        until it is written to.
+    """
+
+    _content_hash = None
+
+    def _load_data(self, data):
+        super(ArenaTask, self)._load_data(data)
+        self._content_hash = content_hash(data)
+
+    def _update_data(self, *args, **kwargs):
+        self._content_hash = None
+        super(ArenaTask, self)._update_data(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        self._content_hash = None
+        super(ArenaTask, self).__setitem__(key, value)
+
+    def content_hash(self):
+        if self._content_hash is None:
+            self._content_hash = content_hash(
+                {field: self._serialize(field, self._data[field])
+                 for field in tw_attrs_editable if field in self._data})
+        return self._content_hash
+
+
 class SharedTask(object):
     """ A Task that can be shared in a TaskArena."""
 
@@ -78,7 +200,7 @@ class SharedTask(object):
         if value:
             self.tw_task['Arena'] = self.Arena.name
             if not self.ArenaTaskID:
-                self.ArenaTaskID = uuid.uuid4()
+                self.ArenaTaskID = str(uuid.uuid4())
         else:
             self.remove()
 
@@ -92,6 +214,9 @@ class SharedTask(object):
 
     ArenaTaskID = property(_get_arena_task_id, _set_arena_task_id)
 
+    def __getitem__(self, field):
+        return self.tw_task[field]
+
     def remove(self):
         self.tw_task['Arena'] = ''
         self.tw_task['ArenaTaskID'] = ''
@@ -101,12 +226,29 @@ class SharedTask(object):
             if self.tw_task['modified'] \
             else self.tw_task['entry']
 
+    def content_hash(self):
+        """ Returns the cached content hash of the task or None if the task
+            does not cache one.
+        """
+        if isinstance(self.tw_task, ArenaTask):
+            return self.tw_task.content_hash()
+        return None
+
+    def same_content(self, other):
+        content_hash = self.content_hash()
+        return content_hash is not None and \
+            content_hash == other.content_hash()
+
     def update(self, other):
+        if self.same_content(other):
+            return
         for field in tw_attrs_editable:
             if self.tw_task[field] != other.tw_task[field]:
                 self.tw_task[field] = other.tw_task[field]
 
     def different_fields(self, other):
+        if self.same_content(other):
+            return []
         result = []
         for field in tw_attrs_editable:
             if self.tw_task[field] != other.tw_task[field]:
@@ -130,8 +272,143 @@ class SharedTask(object):
     def __str__(self):
         return str(self.__repr__())
 
+    def index_entry(self):
+        return (self.ArenaTaskID, self.tw_task['uuid'],
+                self.tw_task._serialize('modified', self.tw_task['modified']))
+
     def save(self):
-        self.tw_task.save()
+        if task_index.enabled:
+            data_location = self.tw_task.warrior.config.get('data.location')
+            fresh = task_index.is_fresh(data_location)
+            hashes_fresh = task_index.hashes_are_fresh(data_location)
+            self.tw_task.save()
+            if self.ArenaTaskID:
+                task_index.record(data_location, [self.index_entry()], fresh)
+            # without an ArenaTaskID the task left an arena, whose stored
+            # hashes cannot be updated
+            task_index.update_hashes(
+                data_location,
+                hashes_of([json.loads(self.tw_task.export_data())]),
+                hashes_fresh and bool(self.ArenaTaskID))
+        else:
+            self.tw_task.save()
+
+
+class TaskWarriorPool(object):
+    """ Shares one TaskWarrior per data location between all arenas. """
+
+    def __init__(self):
+        self.warriors = {}
+        self.lock = threading.Lock()
+
+    def get(self, data_location):
+        if is_remote(data_location):
+            key = data_location
+        else:
+            key = os.path.abspath(os.path.expanduser(data_location))
+        with self.lock:
+            if key not in self.warriors:
+                if is_remote(key):
+                    self.warriors[key] = RemoteTaskWarrior(key)
+                else:
+                    self.warriors[key] = RunnerTaskWarrior(data_location=key)
+            return self.warriors[key]
+
+    def clear(self):
+        with self.lock:
+            self.warriors = {}
+
+task_warrior_pool = TaskWarriorPool()
+
+
+class ExportCache(object):
+    """ Remembers exports of arena tasks per data location and filter, so
+        that arenas sharing a data location export it only once as long as
+        its data files do not change.
+    """
+
+    def __init__(self):
+        self.exports = {}
+        self.locks = {}
+        self.guard = threading.Lock()
+
+    def partitions(self, etw, pattern=[]):
+        """ Returns the raw data of all arena tasks matching pattern,
+            partitioned by the name of their arena.
+        """
+        data_location = etw.data_location
+        key = (data_location, tuple(pattern))
+        with self.guard:
+            lock = self.locks.setdefault(key, threading.Lock())
+        with lock:
+            signature = data_signature(data_location)
+            cached = self.exports.get(key)
+            if cached and cached[0] == signature:
+                return cached[1]
+            partitions = {}
+            for data in etw.export_arena_tasks(pattern):
+                partitions.setdefault(data.get('Arena'), []).append(data)
+            if not any(signature):
+                with self.guard:
+                    self.locks.pop(key, None)
+            else:
+                self.store(key, signature, partitions)
+                if not pattern:
+                    task_index.record_hashes(
+                        data_location,
+                        {arena: {str(data['ArenaTaskID']): content_hash(data)
+                                 for data in tasks
+                                 if data.get('ArenaTaskID')}
+                         for arena, tasks in partitions.items()},
+                        signature)
+                    task_index.record(
+                        data_location,
+                        [(data.get('ArenaTaskID'), data.get('uuid'),
+                          data.get('modified'))
+                         for tasks in partitions.values() for data in tasks
+                         if data.get('ArenaTaskID')],
+                        rebuild=True, signature=signature)
+            return partitions
+
+    def store(self, key, signature, partitions):
+        """ Stores an export and drops all exports of the same data location
+            with another signature, together with their locks.
+        """
+        with self.guard:
+            for stale in [k for k, (cached_signature, _) in
+                          self.exports.items()
+                          if k[0] == key[0] and cached_signature != signature]:
+                del self.exports[stale]
+                if stale != key:
+                    self.locks.pop(stale, None)
+            self.exports[key] = (signature, partitions)
+
+    def lookup(self, data_location, uuids):
+        """ Returns a dict mapping those of uuids found in fresh exports of
+            data_location to their raw data.
+        """
+        signature = data_signature(data_location)
+        result = {}
+        for (location, _), (cached_signature, partitions) in \
+                list(self.exports.items()):
+            if location != data_location or cached_signature != signature:
+                continue
+            for tasks in partitions.values():
+                for data in tasks:
+                    if data.get('uuid') in uuids:
+                        result[data['uuid']] = data
+        return result
+
+    def is_cached(self, data_location, pattern=[]):
+        cached = self.exports.get((data_location, tuple(pattern)))
+        return bool(cached) and cached[0] == data_signature(data_location)
+
+    def clear(self):
+        with self.guard:
+            self.exports = {}
+            self.locks = {}
+
+export_cache = ExportCache()
 
 
 class EnhancedTaskWarrior(object):
@@ -139,34 +416,248 @@ class EnhancedTaskWarrior(object):
         tasks in a TaskArena.
     """
 
+    native_reader = False
+    max_bucket_filter = 16
+
     def __init__(self, tw, arena):
         self.tw = tw
         self.arena = arena
         for uda in uda_config_list:
             self.tw.config.update({uda[0]: uda[1]})
 
-    def tasks(self, pattern):
-        return [SharedTask(task, self.arena) for task in
-                self.tw.tasks.filter(*pattern)]
+    @property
+    def data_location(self):
+        return self.tw.config.get('data.location')
+
+    def export(self, pattern):
+        """ Exports the tasks matching pattern as raw TaskWarrior data. """
+        self.tw.enforce_recurrence()
+        lines = self.tw.execute_command(
+            ['export', '--'] + [p for p in pattern if p])
+        return [json.loads(line.strip(',')) for line in lines
+                if line.strip(',')]
+
+    def export_arena_tasks(self, pattern=[]):
+        """ Exports all tasks belonging to any arena that match pattern. The
+            data files are read directly if the native reader is enabled and
+            understands both the files and the pattern.
+        """
+        if self.native_reader:
+            try:
+                return DataFileReader(self.data_location).arena_tasks(pattern)
+            except UnsupportedFormat:
+                pass
+        return self.export(['Arena.any:'] + list(pattern))
+
+    def change_log(self):
+        """ Returns the ChangeLog of the arena in this data location or None
+            if the TaskWarrior cannot keep one.
+        """
+        if hasattr(self.tw, 'change_log'):
+            return self.tw.change_log(self.arena.name)
+        return ChangeLog(change_log_file(self.data_location, self.arena.name))
+
+    def shared_task(self, data):
+        task = ArenaTask(self.tw)
+        task._load_data(data)
+        return SharedTask(task, self.arena)
+
+    def wrap(self, data, records=False):
+        return TaskRecord(data) if records else self.shared_task(data)
+
+    def tasks(self, pattern, records=False):
+        return [self.wrap(data, records) for data in self.export(pattern)]
+
+    def arena_tasks(self, pattern=[], records=False):
+        """ Returns the tasks of the arena matching pattern, as TaskRecords
+            if records is set. The tasks of all arenas in this data location
+            are exported at once and cached.
+        """
+        partitions = export_cache.partitions(self, pattern)
+        return [self.wrap(data, records) for data in
+                partitions.get(self.arena.name, [])]
+
+    def shared_tasks(self, records, chunk_size=100):
+        """ Returns a dict mapping the uuids of records to full SharedTasks.
+            Their data is taken from the export cache while it is fresh and
+            exported by uuid otherwise.
+        """
+        uuids = set(record.uuid for record in records)
+        found = export_cache.lookup(self.data_location, uuids)
+        missing = sorted(uuids - set(found))
+        for i in range(0, len(missing), chunk_size):
+            for data in self.export(missing[i:i + chunk_size]):
+                if data.get('uuid') in uuids:
+                    found[data['uuid']] = data
+        return {task_uuid: self.shared_task(data)
+                for task_uuid, data in found.items()}
+
+    def indexed_merkle_tree(self):
+        """ Returns the Merkle tree of the arena tasks in this data location
+            from the content hashes in the task index, or None if the data
+            files changed since they were recorded.
+        """
+        hashes = task_index.content_hashes(self.data_location,
+                                           self.arena.name)
+        return None if hashes is None else MerkleTree(hashes)
+
+    def merkle_tree(self):
+        """ Returns the Merkle tree of the arena tasks in this data location.
+            The content hashes are taken from the task index while the data
+            files are unchanged and from a full export otherwise.
+        """
+        hashes = task_index.content_hashes(self.data_location,
+                                           self.arena.name)
+        if hashes is None:
+            hashes = {str(data['ArenaTaskID']): content_hash(data)
+                      for data in export_cache.partitions(self).get(
+                          self.arena.name, [])
+                      if data.get('ArenaTaskID')}
+        return MerkleTree(hashes)
+
+    def arena_tasks_in_buckets(self, prefixes, records=False):
+        """ Returns the tasks of the arena whose ArenaTaskID starts with any
+            of prefixes. Few buckets are exported with a filter, many with a
+            full export.
+        """
+        prefixes = tuple(prefixes)
+        if not prefixes:
+            return []
+        if len(prefixes) > self.max_bucket_filter or \
+                export_cache.is_cached(self.data_location):
+            pattern = []
+        else:
+            pattern = self.or_filter('ArenaTaskID.startswith:' + prefix
+                                     for prefix in prefixes)
+        return [self.wrap(data, records) for data in
+                export_cache.partitions(self, pattern).get(
+                    self.arena.name, [])
+                if str(data.get('ArenaTaskID', '')).startswith(prefixes)]
+
+    def stream_arena_tasks(self, prefixes, records=True, invert=False):
+        """ Exports the tasks of the arena whose ArenaTaskID starts with any
+            of prefixes, or with none of them if invert is True, without
+            caching them.
+        """
+        prefixes = tuple(prefixes)
+        pattern = ['Arena:' + self.arena.name]
+        if not invert:
+            pattern += self.or_filter('ArenaTaskID.startswith:' + prefix
+                                      for prefix in prefixes)
+        return [self.wrap(data, records) for data in
+                self.export_arena_tasks(pattern)
+                if data.get('Arena') == self.arena.name and
+                str(data.get('ArenaTaskID', '')).startswith(prefixes) !=
+                invert]
+
+    def count_arena_tasks(self, pattern=[]):
+        output = self.tw.execute_command(
+            ['count', 'Arena:' + self.arena.name] + pattern)
+        return int(output[0]) if output else 0
+
+    @staticmethod
+    def or_filter(terms):
+        result = ['(']
+        for term in terms:
+            if len(result) > 1:
+                result.append('or')
+            result.append(term)
+        return result + [')']
+
+    def tasks_by_arena_task_ids(self, arena_task_ids, pattern=[],
+                                chunk_size=100, records=False):
+        """ Returns the tasks with the given ArenaTaskIDs. Tasks known to the
+            task index are looked up by uuid.
+        """
+        arena_task_ids = [str(i) for i in arena_task_ids]
+        uuids = task_index.lookup(self.data_location, arena_task_ids)
+        result = []
+        for i in range(0, len(uuids), chunk_size):
+            result += [task for task in
+                       self.tasks(list(pattern) +
+                                  list(uuids.values())[i:i + chunk_size],
+                                  records)
+                       if task.ArenaTaskID in uuids]
+        found = set(task.ArenaTaskID for task in result)
+        missing = [i for i in arena_task_ids if i not in found]
+        for i in range(0, len(missing), chunk_size):
+            result += self.tasks(list(pattern) + self.or_filter(
+                'ArenaTaskID:' + arena_task_id
+                for arena_task_id in missing[i:i + chunk_size]), records)
+        return result
 
     def add_task(self, task):
-        t = SharedTask(tlib.Task(self.tw), self.arena)
+        t = SharedTask(ArenaTask(self.tw), self.arena)
         for field in tw_attrs_editable:
             t.tw_task[field] = task.tw_task[field]
         return t
 
+    @staticmethod
+    def import_data_of(task):
+        """ Returns the raw data of task as written by ``task import``. Tasks
+            that have not been saved yet are assigned a uuid beforehand.
+        """
+        if not task.tw_task['uuid']:
+            task.tw_task._data['uuid'] = str(uuid.uuid4())
+        data = json.loads(task.tw_task.export_data())
+        for field in ['id', 'urgency']:
+            data.pop(field, None)
+        return data
+
+    def import_data(self, data_list):
+        """ Writes the raw data of all tasks with a single ``task import``. """
+        f = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        try:
+            for data in data_list:
+                f.write(json.dumps(data) + '\n')
+            f.close()
+            fresh = task_index.is_fresh(self.data_location)
+            hashes_fresh = task_index.hashes_are_fresh(self.data_location)
+            self.tw.execute_command(['import', f.name])
+        finally:
+            f.close()
+            os.remove(f.name)
+        task_index.record(self.data_location,
+                          [(data['ArenaTaskID'], data['uuid'], None)
+                           for data in data_list if data.get('ArenaTaskID')],
+                          fresh)
+        task_index.update_hashes(
+            self.data_location, hashes_of(data_list),
+            hashes_fresh and all(data.get('ArenaTaskID')
+                                 for data in data_list))
+
+    def import_tasks(self, tasks):
+        """ Writes all tasks with a single ``task import``. """
+        self.import_data([self.import_data_of(task) for task in tasks])
+        for task in tasks:
+            task.tw_task._update_data({}, update_original=True)
+
     def add_tasks_matching_pattern(self, pattern):
-        tasks = self.tasks(pattern)
-        for ta_task in tasks:
-            ta_task.save()
-        return tasks
+        """ Adds all tasks matching pattern to the arena with a single export
+            and a single import. Returns the number of tasks added.
+        """
+        tasks = [task for task in self.tasks(pattern)
+                 if task.tw_task.modified]
+        if tasks:
+            self.import_tasks(tasks)
+        return len(tasks)
 
     def remove_tasks_matching_pattern(self, pattern):
-        tasks = self.tasks(list(pattern) + ['Arena:' + self.arena.name])
-        for ta_task in tasks:
-            ta_task.remove()
-            ta_task.save()
-        return tasks
+        """ Removes all tasks matching pattern from the arena with a single
+            count and a single modify command. Returns the number of tasks
+            removed.
+        """
+        pattern = list(pattern)
+        if pattern:
+            pattern = ['('] + pattern + [')']
+        # the footer of modify depends on the verbose setting, so the tasks
+        # are counted beforehand
+        count = self.count_arena_tasks(pattern)
+        if count:
+            self.tw.execute_command(
+                pattern + ['Arena:' + self.arena.name,
+                           'modify', 'Arena:', 'ArenaTaskID:'])
+        return count
 
 
 class TaskArena(object):
@@ -175,8 +666,11 @@ class TaskArena(object):
     def __init__(self, arena_name='', ldata='', rdata=''):
         self._local_data = None
         self._remote_data = None
-        self.tw_local = None
-        self.tw_remote = None
+        self._tw_local = None
+        self._tw_remote = None
+        self.last_sync = None
+        self.sync_cursor = None
+        self.change_cursor = None
         self.name = arena_name
         self.local_data = ldata
         self.remote_data = rdata
@@ -187,9 +681,7 @@ class TaskArena(object):
     def set_local_data(self, ldata):
         if ldata:
             self._local_data = ldata
-            self.tw_local = EnhancedTaskWarrior(
-                tlib.TaskWarrior(data_location=ldata),
-                self)
+            self._tw_local = None
 
     local_data = property(get_local_data, set_local_data)
 
@@ -199,12 +691,34 @@ class TaskArena(object):
     def set_remote_data(self, rdata):
         if rdata:
             self._remote_data = rdata
-            self.tw_remote = EnhancedTaskWarrior(
-                tlib.TaskWarrior(data_location=rdata),
-                self)
+            self._tw_remote = None
 
     remote_data = property(get_remote_data, set_remote_data)
 
+    def get_tw_local(self):
+        if self._tw_local is None and self.local_data:
+            self._tw_local = EnhancedTaskWarrior(
+                task_warrior_pool.get(self.local_data),
+                self)
+        return self._tw_local
+
+    def set_tw_local(self, etw):
+        self._tw_local = etw
+
+    tw_local = property(get_tw_local, set_tw_local)
+
+    def get_tw_remote(self):
+        if self._tw_remote is None and self.remote_data:
+            self._tw_remote = EnhancedTaskWarrior(
+                task_warrior_pool.get(self.remote_data),
+                self)
+        return self._tw_remote
+
+    def set_tw_remote(self, etw):
+        self._tw_remote = etw
+
+    tw_remote = property(get_tw_remote, set_tw_remote)
+
     def get_json(self):
         return self.__repr__()
 
@@ -212,22 +726,57 @@ class TaskArena(object):
         self.name = data['name']
         self.local_data = data['local_data']
         self.remote_data = data['remote_data']
+        self.last_sync = data.get('last_sync')
+        self.sync_cursor = data.get('sync_cursor')
+        self.change_cursor = data.get('change_cursor')
 
     json = property(get_json, set_json)
 
     def __repr__(self):
         return {'name': self.name,
                 'local_data': self.local_data,
-                'remote_data': self.remote_data}
+                'remote_data': self.remote_data,
+                'last_sync': self.last_sync,
+                'sync_cursor': self.sync_cursor,
+                'change_cursor': self.change_cursor}
 
     def __str__(self):
         return str(self.__repr__())
 
-    def get_local_tasks(self, pattern=[]):
-        return self.tw_local.tasks(['Arena:' + self.name] + pattern)
+    def get_local_tasks(self, pattern=[], records=False):
+        return self.tw_local.arena_tasks(pattern, records)
+
+    def get_remote_tasks(self, pattern=[], records=False):
+        return self.tw_remote.arena_tasks(pattern, records)
+
+    def get_local_tasks_by_ids(self, arena_task_ids, records=False):
+        return self.tw_local.tasks_by_arena_task_ids(
+            arena_task_ids, ['Arena:' + self.name], records=records)
+
+    def get_remote_tasks_by_ids(self, arena_task_ids, records=False):
+        return self.tw_remote.tasks_by_arena_task_ids(
+            arena_task_ids, ['Arena:' + self.name], records=records)
+
+    def get_local_tasks_in_buckets(self, prefixes, records=False):
+        return self.tw_local.arena_tasks_in_buckets(prefixes, records)
+
+    def get_remote_tasks_in_buckets(self, prefixes, records=False):
+        return self.tw_remote.arena_tasks_in_buckets(prefixes, records)
+
+    @staticmethod
+    def timestamp(seconds_ago=0):
+        return (datetime.datetime.now(datetime.timezone.utc) -
+                datetime.timedelta(seconds=seconds_ago)).strftime(
+                    '%Y%m%dT%H%M%SZ')
 
-    def get_remote_tasks(self, pattern=[]):
-        return self.tw_remote.tasks(['Arena:' + self.name] + pattern)
+    @classmethod
+    def watermark(cls):
+        """ Returns the last sync watermark for a sync starting now. Tasks
+            are filtered with modified.after, which is strict and has a
+            resolution of one second, so the watermark is one second early
+            to not miss tasks modified later in the same second.
+        """
+        return cls.timestamp(1)
 
 
 class TaskEmperor(object):
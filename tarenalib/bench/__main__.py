@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import click
+import json
+from tarenalib.bench.run import run_benchmark
+
+
+@click.command(help='Benchmarks the sync phases on synthetic arenas.')
+@click.option('--tasks', '-n', type=int, multiple=True,
+              default=[1000, 10000, 100000],
+              help='Number of tasks, can be given several times.')
+@click.option('--change-rate', default=0.01,
+              help='Fraction of tasks changed on one side.')
+@click.option('--conflict-rate', default=0.001,
+              help='Fraction of tasks changed on both sides.')
+@click.option('--new-rate', default=0.01,
+              help='Fraction of tasks existing on one side only.')
+@click.option('--annotations', default=0,
+              help='Number of annotations per task.')
+@click.option('--batch', is_flag=True,
+              help='Write each side with a single task import.')
+def main(tasks, change_rate, conflict_rate, new_rate, annotations, batch):
+    results = [run_benchmark(num_tasks, batch,
+                             change_rate=change_rate,
+                             conflict_rate=conflict_rate,
+                             new_rate=new_rate,
+                             annotations=annotations)
+               for num_tasks in tasks]
+    click.echo(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
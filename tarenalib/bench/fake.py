@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import datetime
+import json
+import uuid
+from collections import OrderedDict
+import tasklib.task as tlib
+
+
+def now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime(
+        tlib.DATE_FORMAT)
+
+
+class FakeTaskWarrior(object):
+    """ An in-memory stand-in for tasklib's TaskWarrior. It understands the
+        commands and filters TaskArena sends to TaskWarrior and keeps the
+        tasks in their exported form.
+    """
+
+    version = tlib.VERSION_2_4_3
+
+    def __init__(self, data_location=''):
+        self.config = {'data.location': data_location}
+        self.data = OrderedDict()
+        self.ids = {}
+        self.positions = {}
+        self.arena_task_ids = {}
+        self.commands = []
+        self.tasks = tlib.TaskQuerySet(self)
+
+    filter_tasks = tlib.TaskWarrior.filter_tasks
+
+    def __deepcopy__(self, memo):
+        # tasklib deep copies annotations, which refer to their task and its
+        # warrior, and copies of tasks share their warrior
+        return self
+
+    def enforce_recurrence(self):
+        pass
+
+    def change_log(self, arena_name):
+        return None
+
+    def add_data(self, data):
+        data = dict(data)
+        data.setdefault('uuid', str(uuid.uuid4()))
+        data.setdefault('entry', now())
+        data.setdefault('modified', data['entry'])
+        data.setdefault('status', 'pending')
+        if data['uuid'] not in self.data:
+            data['id'] = len(self.ids) + 1
+            self.ids[data['id']] = data['uuid']
+            self.positions[data['uuid']] = len(self.positions)
+        else:
+            data['id'] = self.data[data['uuid']]['id']
+            self.unindex(self.data[data['uuid']])
+        self.data[data['uuid']] = data
+        self.index(data)
+        return data
+
+    def index(self, data):
+        self.arena_task_ids.setdefault(
+            str(data.get('ArenaTaskID', '')), set()).add(data['uuid'])
+
+    def unindex(self, data):
+        self.arena_task_ids.get(
+            str(data.get('ArenaTaskID', '')), set()).discard(data['uuid'])
+
+    def execute_command(self, args, config_override={}, allow_failure=True,
+                        return_all=False):
+        args = [str(arg) for arg in args]
+        self.commands.append(args)
+        if args[0] == 'export':
+            output = [json.dumps(data) for data in
+                      self.matching(args[2:] if args[1:2] == ['--']
+                                    else args[1:])]
+        elif args[0] == 'add':
+            data = self.add_data(self.parse_fields(args[1:]))
+            output = ['Created task %d.' % data['id']]
+        elif args[0] == 'import':
+            with open(args[1]) as f:
+                for line in f:
+                    if line.strip():
+                        data = json.loads(line)
+                        data['modified'] = now()
+                        self.add_data(data)
+            output = ['Imported.']
+        elif args[0] == 'count':
+            output = [str(len(self.matching(args[1:])))]
+        elif args[1:2] == ['export']:
+            output = [json.dumps(self.data[self.resolve(args[0])])]
+        elif 'modify' in args:
+            position = args.index('modify')
+            tasks = self.matching(args[:position])
+            fields = self.parse_fields(args[position + 1:])
+            for data in tasks:
+                self.modify(data['uuid'], fields)
+            output = ['Modified %d tasks.' % len(tasks)]
+        else:
+            raise tlib.TaskWarriorException('Unsupported command: ' +
+                                            ' '.join(args))
+        if return_all:
+            return output, [], 0
+        return output
+
+    def resolve(self, key):
+        return self.ids[int(key)] if key.isdigit() else key
+
+    def modify(self, task_uuid, fields):
+        data = self.data[task_uuid]
+        self.unindex(data)
+        for key, value in fields.items():
+            if value in ['', []]:
+                data.pop(key, None)
+            else:
+                data[key] = value
+        data['modified'] = now()
+        self.index(data)
+
+    @staticmethod
+    def parse_fields(args):
+        fields = {}
+        for arg in args:
+            key, value = arg.split(':', 1)
+            if len(value) > 1 and value[0] == value[-1] == "'":
+                value = value[1:-1]
+            if key == 'tags':
+                value = value.split(',') if value else []
+            fields[key] = value
+        return fields
+
+    @staticmethod
+    def match_term(data, term):
+        if term.isdigit():
+            return int(term) == data.get('id')
+        if ':' not in term:
+            return term == data.get('uuid') or \
+                term in data.get('description', '')
+        key, value = term.split(':', 1)
+        if len(value) > 1 and value[0] == value[-1] == "'":
+            value = value[1:-1]
+        attribute, _, modifier = key.partition('.')
+        actual = data.get(attribute, '')
+        if isinstance(actual, list):
+            actual = ','.join(actual)
+        actual = str(actual)
+        if modifier in ['', 'is']:
+            return actual == value
+        elif modifier == 'any':
+            return actual != ''
+        elif modifier == 'none':
+            return actual == ''
+        elif modifier == 'after':
+            return actual > value
+        elif modifier == 'before':
+            return actual != '' and actual < value
+        elif modifier == 'startswith':
+            return actual.startswith(value)
+        raise tlib.TaskWarriorException('Unsupported filter: ' + term)
+
+    def matching(self, terms):
+        """ Returns all tasks matching terms, which are ANDed. Parenthesized
+            groups of terms joined by 'or' are supported, other parentheses
+            are ignored, and uuids form a single group as in TaskWarrior.
+        """
+        groups = []
+        group = None
+        uuids = [term for term in terms if term in self.data]
+        if uuids:
+            groups.append(uuids)
+            terms = [term for term in terms if term not in self.data]
+        for term in terms:
+            if term == '(':
+                group = []
+            elif term == ')':
+                if 'or' in group:
+                    groups.append([t for t in group if t != 'or'])
+                else:
+                    groups += [[t] for t in group]
+                group = None
+            elif group is not None:
+                group.append(term)
+            else:
+                groups.append([term])
+        return [data for data in self.candidates(groups)
+                if all(any(self.match_term(data, term) for term in group)
+                       for group in groups)]
+
+    def lookup(self, term):
+        """ Returns the uuids of the tasks matching a uuid, id or ArenaTaskID
+            term, or None for any other term.
+        """
+        if term in self.data:
+            return [term]
+        if term.isdigit():
+            return [self.ids[int(term)]] if int(term) in self.ids else []
+        key, _, value = term.partition(':')
+        if key in ['ArenaTaskID', 'ArenaTaskID.is'] and value:
+            if len(value) > 1 and value[0] == value[-1] == "'":
+                value = value[1:-1]
+            return list(self.arena_task_ids.get(value, []))
+        return None
+
+    def candidates(self, groups):
+        """ Returns the tasks that may match groups in the order they were
+            added. A group consisting of uuid, id and ArenaTaskID terms only
+            is looked up in the indexes, otherwise all tasks are scanned.
+        """
+        for group in groups:
+            uuids = set()
+            for term in group:
+                found = self.lookup(term)
+                if found is None:
+                    break
+                uuids.update(found)
+            else:
+                return [self.data[task_uuid] for task_uuid in
+                        sorted(uuids, key=self.positions.get)]
+        return self.data.values()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import datetime
+import random
+import uuid
+import tasklib.task as tlib
+from tarenalib.arena import TaskArena, EnhancedTaskWarrior
+from tarenalib.bench.fake import FakeTaskWarrior
+
+
+def timestamp(base, seconds):
+    return (base + datetime.timedelta(seconds=seconds)).strftime(
+        tlib.DATE_FORMAT)
+
+
+def generate_arena(num_tasks, change_rate=0.01, conflict_rate=0.001,
+                   new_rate=0.01, annotations=0, seed=0):
+    """ Creates an arena backed by two FakeTaskWarriors holding num_tasks
+        shared tasks. A fraction change_rate of them is modified on one
+        side, conflict_rate on both sides, and new_rate of num_tasks tasks
+        exist on one side only.
+    """
+    rng = random.Random(seed)
+    base = datetime.datetime(2015, 10, 10, tzinfo=datetime.timezone.utc)
+    arena = TaskArena('bench', '/bench/local', '/bench/remote')
+    arena.tw_local = EnhancedTaskWarrior(FakeTaskWarrior('/bench/local'),
+                                         arena)
+    arena.tw_remote = EnhancedTaskWarrior(FakeTaskWarrior('/bench/remote'),
+                                          arena)
+    sides = [arena.tw_local.tw, arena.tw_remote.tw]
+    for i in range(num_tasks):
+        data = {
+            'Arena': arena.name,
+            'ArenaTaskID': str(uuid.UUID(int=rng.getrandbits(128))),
+            'description': 'task %d' % i,
+            'project': 'project%d' % (i % 10),
+            'tags': ['tag%d' % (i % 7)],
+            'entry': timestamp(base, i),
+            'modified': timestamp(base, i),
+        }
+        if annotations:
+            data['annotations'] = [
+                {'entry': timestamp(base, i + j),
+                 'description': 'annotation %d' % j}
+                for j in range(annotations)]
+        draw = rng.random()
+        changed_side = rng.randrange(2)
+        for side, tw in enumerate(sides):
+            task_data = dict(data, uuid=str(uuid.uuid4()))
+            if draw < conflict_rate or \
+                    (draw < conflict_rate + change_rate and
+                     side == changed_side):
+                task_data['description'] += ' (changed on side %d)' % side
+                task_data['modified'] = timestamp(base, num_tasks + i + side)
+            tw.add_data(task_data)
+    for i in range(int(num_tasks * new_rate)):
+        sides[i % 2].add_data({
+            'Arena': arena.name,
+            'ArenaTaskID': str(uuid.UUID(int=rng.getrandbits(128))),
+            'description': 'new task %d' % i,
+            'entry': timestamp(base, 2 * num_tasks + i),
+        })
+    return arena
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+import tracemalloc
+from collections import OrderedDict
+from tarenalib.bench.generate import generate_arena
+from tarenalib.io import IOManager
+from tarenalib.sync import SyncManager
+
+
+def measure(phases, name, func):
+    tracemalloc.clear_traces()
+    start = time.perf_counter()
+    result = func()
+    phases[name] = OrderedDict([
+        ('seconds', round(time.perf_counter() - start, 6)),
+        ('peak_bytes', tracemalloc.get_traced_memory()[1]),
+    ])
+    return result
+
+
+def accept_suggestions(synclist):
+    for elem in synclist:
+        elem.action = elem.suggestion
+
+
+def run_benchmark(num_tasks, batch=False, **settings):
+    """ Syncs a synthetic arena of num_tasks tasks and returns time and
+        peak memory of every sync phase.
+    """
+    arena = generate_arena(num_tasks, **settings)
+    sm = SyncManager(arena, IOManager(show_output=False), batch=batch,
+                     interactive=False)
+    phases = OrderedDict()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        local_tasks, remote_tasks = measure(
+            phases, 'export', lambda: sm.export_tasks(full=True))
+        measure(phases, 'generate_synclist',
+                lambda: sm.generate_synclist(local_tasks, remote_tasks))
+        measure(phases, 'suggest_conflict_resolution',
+                sm.suggest_conflict_resolution)
+        accept_suggestions(sm.synclist)
+        measure(phases, 'carry_out_sync', sm.carry_out_sync)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return OrderedDict([
+        ('tasks', num_tasks),
+        ('batch', batch),
+        ('settings', settings),
+        ('elements', len(sm.synclist)),
+        ('commands', OrderedDict([
+            ('local', len(arena.tw_local.tw.commands)),
+            ('remote', len(arena.tw_remote.tw.commands)),
+        ])),
+        ('phases', phases),
+    ])
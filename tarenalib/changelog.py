@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import fcntl
+import json
+import os
+import urllib.parse
+import uuid
+from contextlib import contextmanager
+
+
+def change_log_file(data_location, arena_name):
+    return os.path.join(os.path.expanduser(data_location), 'arena-changes',
+                        urllib.parse.quote(arena_name, safe='') + '.log')
+
+
+class ChangeLog(object):
+    """ An append-only log of all tasks of an arena written to a data
+        location by a sync. Every entry holds a sequence number, the
+        ArenaTaskID, the modification time and the content hash of a task.
+
+        A cursor marks a position in the log. Reading the changes since a
+        cursor only reads the tail of the log behind it. Compaction keeps
+        only the latest entry of every task and starts a new generation of
+        the log, in which older cursors are resolved by sequence number.
+        The log compacts itself once it holds more than twice the entries
+        it held after the last compaction, and at least min_compaction.
+    """
+
+    min_compaction = 1000
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    @contextmanager
+    def locked(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        with open(self.filename + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def read_header(f):
+        return json.loads(f.readline().decode('utf-8'))
+
+    @staticmethod
+    def tail(f, header):
+        """ Returns the sequence number of the last complete entry and the
+            position behind it, reading only the end of the file.
+        """
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 4096))
+        lines = f.read().split(b'\n')
+        position = size - len(lines[-1])
+        for line in reversed(lines[:-1]):
+            try:
+                return json.loads(line.decode('utf-8'))['sequence'], position
+            except (ValueError, KeyError):
+                break
+        return header['compacted'], position
+
+    def write(self, header, entries):
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+            f.write(''.join(json.dumps(e, sort_keys=True) + '\n'
+                            for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.filename)
+
+    def append(self, entries):
+        """ Appends entries, dicts with ArenaTaskID, modified and hash, and
+            returns the cursor behind them.
+        """
+        with self.locked():
+            if not self.exists():
+                self.write({'generation': uuid.uuid4().hex, 'compacted': 0,
+                            'size': 0}, [])
+            with open(self.filename, 'rb+') as f:
+                header = self.read_header(f)
+                sequence, position = self.tail(f, header)
+                # drops a line cut short by a crash
+                f.truncate(position)
+                f.seek(position)
+                for entry in entries:
+                    sequence += 1
+                    f.write(json.dumps(dict(entry, sequence=sequence),
+                                       sort_keys=True).encode('utf-8') +
+                            b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+                position = f.tell()
+            if sequence - header['compacted'] > \
+                    max(self.min_compaction, header['size']):
+                return self.compact_locked()
+        return {'generation': header['generation'], 'offset': position,
+                'sequence': sequence}
+
+    @staticmethod
+    def read_entries(f):
+        """ Returns all complete entries from the position of f on and the
+            position behind the last of them.
+        """
+        entries = []
+        position = f.tell()
+        for line in iter(f.readline, b''):
+            if not line.endswith(b'\n'):
+                break
+            entries.append(json.loads(line.decode('utf-8')))
+            position += len(line)
+        return entries, position
+
+    def since(self, cursor=None):
+        """ Returns the entries appended after cursor, or all entries if
+            cursor is None, and the cursor behind them. Without a log there
+            are no entries and no cursor.
+        """
+        if not self.exists():
+            return [], cursor
+        with open(self.filename, 'rb') as f:
+            header = self.read_header(f)
+            if cursor and cursor.get('generation') == header['generation']:
+                f.seek(cursor['offset'])
+                entries, position = self.read_entries(f)
+            else:
+                entries, position = self.read_entries(f)
+                if cursor:
+                    entries = [e for e in entries
+                               if e['sequence'] > cursor['sequence']]
+        if entries:
+            sequence = entries[-1]['sequence']
+        else:
+            sequence = cursor['sequence'] if cursor else header['compacted']
+        return entries, {'generation': header['generation'],
+                         'offset': position, 'sequence': sequence}
+
+    def end(self):
+        """ Returns the cursor behind the last entry without reading the
+            entries, or None if there is no log.
+        """
+        if not self.exists():
+            return None
+        with open(self.filename, 'rb') as f:
+            header = self.read_header(f)
+            sequence, position = self.tail(f, header)
+        return {'generation': header['generation'], 'offset': position,
+                'sequence': sequence}
+
+    def compact_locked(self):
+        with open(self.filename, 'rb') as f:
+            header = self.read_header(f)
+            entries, _ = self.read_entries(f)
+        latest = {}
+        for entry in entries:
+            latest[entry['ArenaTaskID']] = entry
+        kept = sorted(latest.values(), key=lambda e: e['sequence'])
+        sequence = entries[-1]['sequence'] if entries else \
+            header['compacted']
+        header = {'generation': uuid.uuid4().hex, 'compacted': sequence,
+                  'size': len(kept)}
+        self.write(header, kept)
+        return {'generation': header['generation'],
+                'offset': os.path.getsize(self.filename),
+                'sequence': sequence}
+
+    def compact(self):
+        """ Keeps only the latest entry of every task. """
+        if self.exists():
+            with self.locked():
+                self.compact_locked()
@@ -20,42 +20,107 @@
 
 
 import click
-from tarenalib.arena import uda_config_list
+from tarenalib.arena import uda_config_list, EnhancedTaskWarrior
+from tarenalib.hooks import DirtyQueue, install_hooks, uninstall_hooks
+from tarenalib.index import task_index
 from tarenalib.io import IOManager
-from tarenalib.sync import SyncManager
-import subprocess
+from tarenalib.journal import SyncJournal
+from tarenalib.policy import Policy, InvalidPolicy, DecisionLog
+from tarenalib.remote import default_port
+from tarenalib.runner import command_runner
+from tarenalib.server import SyncServer, InvalidRequest, parse_locations
+from tarenalib.sync import SyncManager, sync_arenas
+from tarenalib.trace import Tracer
+from tarenalib.watch import WatchLoop
+import cProfile
+import os
 import locale
+import threading
+import time
 
 iom = IOManager()
+tracer = Tracer(enabled=False)
 
 
 def execute_command(command_args):
-    p = subprocess.Popen(command_args,
-                         stdin=subprocess.PIPE,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE,
-                         )
+    # task config rewrites the whole taskrc, so config writes are not run
+    # concurrently
     encoding = locale.getdefaultlocale()[1]
-    p.communicate(input='y\n'.encode(encoding))
+    command_runner.run(command_args, key='taskrc',
+                       input='y\n'.encode(encoding))
+
+
+def write_profile(profile, cprofile, profiler):
+    if profile:
+        with open(profile, 'w') as f:
+            tracer.save(f)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(cprofile)
 
 
 @click.group()
 @click.option('--file')
-def cli(file):
+@click.option('--native', is_flag=True,
+              help='Read arena tasks directly from the data files.')
+@click.option('--profile', type=click.Path(),
+              help='Write timings of all sync phases to this file.')
+@click.option('--cprofile', type=click.Path(),
+              help='Write a cProfile dump to this file.')
+@click.option('--timeout', type=float,
+              help='Kill task commands running longer than this many seconds.')
+@click.option('--task-jobs', default=2,
+              help='Maximum number of task commands per data location.')
+@click.pass_context
+def cli(ctx, file, native, profile, cprofile, timeout, task_jobs):
     iom.configfile_name = file
+    EnhancedTaskWarrior.native_reader = native
+    tracer.enabled = bool(profile)
+    command_runner.timeout = timeout
+    command_runner.concurrency = task_jobs
+    profiler = None
+    if cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    ctx.call_on_close(lambda: write_profile(profile, cprofile, profiler))
+
+
+hooks_option = click.option(
+    '--hooks', type=click.Path(),
+    help='The hooks directory of TaskWarrior, by default as configured in '
+         'the taskrc.')
+
+
+def hooks_location():
+    """ The hooks directory of TaskWarrior: hooks.location if it is set,
+        otherwise the hooks directory in the data location.
+    """
+    for setting in ['rc.hooks.location', 'rc.data.location']:
+        stdout, stderr, returncode = command_runner.run(
+            ['task', '_get', setting])
+        if not returncode and stdout.strip():
+            location = os.path.expanduser(stdout.strip())
+            if setting == 'rc.data.location':
+                location = os.path.join(location, 'hooks')
+            return location
+    return os.path.expanduser('~/.task/hooks')
 
 
 @cli.command(help='Installs TaskArena.')
-def install():
+@hooks_option
+def install(hooks):
     for uda in uda_config_list:
         execute_command(['task', 'config', uda[0], uda[1]])
+    install_hooks(hooks or hooks_location(), iom.dirty_queue_directory)
     iom.send_message('Installation successful.')
 
 
 @cli.command(help='Uninstalls TaskArena.')
-def uninstall():
+@hooks_option
+def uninstall(hooks):
     for uda in uda_config_list:
         execute_command(['task', 'config', uda[0]])
+    uninstall_hooks(hooks or hooks_location(), iom.dirty_queue_directory)
     iom.send_message('Uninstallation successful.')
 
 
@@ -82,13 +147,15 @@ class FoundArena(object):
 
 
 def find_arena(ctx, param, value):
+    if value is None:
+        return None
     te = iom.get_task_emperor()
     arena = te.find(value)
     if not arena:
         iom.send_message("Arena " + value + " not found.")
         return None
     else:
-        return FoundArena(arena, te,  SyncManager(arena, iom))
+        return FoundArena(arena, te, SyncManager(arena, iom, tracer=tracer))
 
 
 @cli.command(help='Deletes ARENA.')
@@ -118,8 +185,11 @@ def arenas():
 @click.argument('pattern', nargs=-1)
 def add(found_arena, pattern):
     if found_arena:
-        found_arena.arena.tw_local.add_tasks_matching_pattern(pattern)
-        iom.send_message("Tasks added.")
+        start = time.perf_counter()
+        count = found_arena.arena.tw_local.add_tasks_matching_pattern(pattern)
+        iom.send_message("%d tasks added to %s in %.2fs." %
+                         (count, found_arena.arena.name,
+                          time.perf_counter() - start))
 
 
 @cli.command(help='Removes tasks matching PATTERN from ARENA.')
@@ -127,8 +197,12 @@ def add(found_arena, pattern):
 @click.argument('pattern', nargs=-1)
 def remove(found_arena, pattern):
     if found_arena:
-        found_arena.arena.tw_local.remove_tasks_matching_pattern(pattern)
-        iom.send_message("Tasks removed from " + found_arena.arena.name + ".")
+        start = time.perf_counter()
+        count = found_arena.arena.tw_local.remove_tasks_matching_pattern(
+            pattern)
+        iom.send_message("%d tasks removed from %s in %.2fs." %
+                         (count, found_arena.arena.name,
+                          time.perf_counter() - start))
 
 
 @cli.command(help='Lists all local tasks matching PATTERN from ARENA.')
@@ -136,8 +210,8 @@ def remove(found_arena, pattern):
 @click.argument('pattern', nargs=-1)
 def local(found_arena, pattern):
     if found_arena:
-        for task in found_arena.arena.get_local_tasks(list(pattern)):
-            iom.send_message(task.tw_task['description'])
+        for task in found_arena.arena.get_local_tasks(list(pattern), True):
+            iom.send_message(task['description'])
 
 
 @cli.command(help='Lists all remote tasks matching PATTERN from ARENA.')
@@ -145,15 +219,175 @@ def local(found_arena, pattern):
 @click.argument('pattern', nargs=-1)
 def remote(found_arena, pattern):
     if found_arena:
-        for task in found_arena.arena.get_remote_tasks(list(pattern)):
-            iom.send_message(task.tw_task['description'])
-
-
-@cli.command(help='Synchronizes ARENA')
-@click.argument('found_arena', callback=find_arena)
-def sync(found_arena):
+        for task in found_arena.arena.get_remote_tasks(list(pattern), True):
+            iom.send_message(task['description'])
+
+
+def journal(arena):
+    return SyncJournal(iom.journal_file_name(arena.name))
+
+
+def dirty_queue(arena):
+    return DirtyQueue(iom.dirty_queue_directory, arena.name)
+
+
+def checkpoint(te):
+    """ Returns a function saving te that can be called from any thread. """
+    lock = threading.Lock()
+
+    def save():
+        with lock:
+            iom.save_task_emperor(te, quiet=True)
+    return save
+
+
+def open_index():
+    """ Opens the task index next to the config file for this command. """
+    task_index.open(iom.index_file_name)
+    click.get_current_context().call_on_close(lambda: task_index.open(None))
+
+
+@cli.command(help='Synchronizes ARENA, or all arenas with --all.')
+@click.argument('arena_name', required=False)
+@click.option('--batch', is_flag=True,
+              help='Write each side with a single task import.')
+@click.option('--full', is_flag=True,
+              help='Ignore the last sync and compare all tasks.')
+@click.option('--all', 'sync_all', is_flag=True,
+              help='Synchronize all arenas, accepting all suggestions.')
+@click.option('--jobs', default=4,
+              help='Number of arenas synchronized in parallel.')
+@click.option('--chunk-size', default=0,
+              help='Sync in chunks of about this many tasks.')
+@click.option('--resume', is_flag=True,
+              help='Only finish an interrupted sync.')
+@click.option('--policy', multiple=True,
+              help='Resolve without asking: newest, local, remote, skip, '
+                   'project:<project>=<winner> or field:<field>=<winner>.')
+@click.option('--decision-log', type=click.Path(),
+              help='Append the decisions of the policy to this file.')
+@click.option('--preview-limit', type=int,
+              help='Show at most this many tasks in the sync preview.')
+@click.option('--pager', is_flag=True,
+              help='Show the sync preview in a pager.')
+def sync(arena_name, batch, full, sync_all, jobs, chunk_size, resume, policy,
+         decision_log, preview_limit, pager):
+    if bool(arena_name) == sync_all:
+        raise click.UsageError('Pass either ARENA or --all.')
+    try:
+        policy = Policy(policy) if policy or decision_log else None
+    except InvalidPolicy as err:
+        iom.send_message(str(err))
+        return
+    decision_log = DecisionLog(decision_log) if decision_log else None
+    open_index()
+    if sync_all:
+        te = iom.get_task_emperor()
+        if te and sync_arenas(te, iom, jobs, batch, full, tracer, chunk_size,
+                              checkpoint(te), journal, policy, decision_log,
+                              dirty_queue):
+            iom.save_task_emperor(te)
+        return
+    found_arena = find_arena(None, None, arena_name)
     if found_arena:
-        found_arena.sm.sync()
+        sm = found_arena.sm
+        sm.batch = batch
+        sm.policy = policy
+        sm.decision_log = decision_log
+        sm.siom.preview_limit = preview_limit
+        sm.siom.pager = pager
+        sm.chunk_size = chunk_size
+        sm.checkpoint = checkpoint(found_arena.te)
+        sm.journal = journal(found_arena.arena)
+        sm.dirty_queue = dirty_queue(found_arena.arena)
+        if resume:
+            synced = sm.replay_journal()
+            if synced is None:
+                iom.send_message("Nothing to resume.")
+        else:
+            synced = sm.sync(full)
+        if synced:
+            iom.save_task_emperor(found_arena.te)
+
+
+@cli.command(help='Watches ARENAS, or all arenas, and syncs them by policy '
+                  'whenever their data changes.')
+@click.argument('arena_names', nargs=-1)
+@click.option('--policy', multiple=True,
+              help='Resolve by these rules instead of newest, as for sync.')
+@click.option('--decision-log', type=click.Path(),
+              help='Append the decisions of the policy to this file.')
+@click.option('--debounce', default=2.0,
+              help='Seconds without changes before an arena is synced.')
+@click.option('--min-interval', default=10.0,
+              help='Minimum seconds between two syncs of an arena.')
+@click.option('--backoff', default=5.0,
+              help='Seconds to wait after a failed sync, doubled for every '
+                   'further failure.')
+@click.option('--max-backoff', default=300.0,
+              help='Maximum seconds to wait after failed syncs.')
+@click.option('--poll', default=5.0,
+              help='Seconds between checks of remote data locations and of '
+                   'data locations that cannot be watched with inotify.')
+def watch(arena_names, policy, decision_log, debounce, min_interval, backoff,
+          max_backoff, poll):
+    try:
+        policy = Policy(policy)
+    except InvalidPolicy as err:
+        iom.send_message(str(err))
+        return
+    open_index()
+    decision_log = DecisionLog(decision_log) if decision_log else None
+    te = iom.get_task_emperor()
+    arenas = [te.find(name) for name in arena_names] if arena_names \
+        else te.arenas
+    if not all(arenas):
+        iom.send_message("Arena " + arena_names[arenas.index(None)] +
+                         " not found.")
+        return
+
+    def sync_manager(arena):
+        return SyncManager(arena, iom, interactive=False, tracer=tracer,
+                           journal=journal(arena), policy=policy,
+                           decision_log=decision_log,
+                           dirty_queue=dirty_queue(arena))
+
+    loop = WatchLoop(arenas, sync_manager, iom, debounce, min_interval,
+                     backoff, max_backoff, poll,
+                     on_sync=lambda arena: iom.save_task_emperor(te, True))
+    iom.send_message("Watching " + ", ".join(a.name for a in arenas) + ".")
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command(help='Serves data locations, given as NAME=DATA_LOCATION, to '
+                  'arenas with a tarena://host:port/NAME remote.')
+@click.argument('locations', nargs=-1, required=True)
+@click.option('--host', default='127.0.0.1',
+              help='Address to listen on. Clients are not authenticated, so '
+                   'only listen on a network you trust.')
+@click.option('--port', default=default_port,
+              help='Port to listen on.')
+def serve(locations, host, port):
+    try:
+        locations = parse_locations(locations)
+    except InvalidRequest as err:
+        iom.send_message(str(err))
+        return
+    open_index()
+    server = SyncServer((host, port), locations)
+    for name in sorted(locations):
+        iom.send_message("Serving " + locations[name] + " as tarena://" +
+                         host + ":" + str(server.server_address[1]) + "/" +
+                         name)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 if __name__ == '__main__':
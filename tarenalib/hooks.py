@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import datetime
+import glob
+import os
+import sys
+import urllib.parse
+import uuid
+
+hook_names = ['on-add.tarena', 'on-modify.tarena']
+
+hook_script = '''#!{python} -S
+# Installed by TaskArena. Queues the ArenaTaskID of every added or modified
+# arena task for the next sync.
+import json
+import os
+import sys
+import urllib.parse
+
+line = sys.stdin.readlines()[-1]
+sys.stdout.write(line)
+task = json.loads(line)
+if task.get('Arena') and task.get('ArenaTaskID'):
+    directory = {directory!r}
+    try:
+        with open(os.path.join(directory, urllib.parse.quote(
+                task['Arena'], safe='') + '.queue'), 'a') as f:
+            f.write(str(task['ArenaTaskID']) + '\\n')
+    except OSError:
+        # the queue is incomplete from now on
+        try:
+            os.remove(os.path.join(directory, 'installed'))
+        except OSError:
+            pass
+'''
+
+
+def timestamp():
+    return datetime.datetime.now(datetime.timezone.utc).strftime(
+        '%Y%m%dT%H%M%SZ')
+
+
+def install_hooks(hooks_location, directory):
+    """ Installs the TaskWarrior hooks queueing changed arena tasks in
+        directory and marks the queues as complete from now on.
+    """
+    os.makedirs(hooks_location, exist_ok=True)
+    os.makedirs(directory, exist_ok=True)
+    script = hook_script.format(python=sys.executable, directory=directory)
+    for name in hook_names:
+        path = os.path.join(hooks_location, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+    with open(os.path.join(directory, 'installed'), 'w') as f:
+        f.write(timestamp())
+
+
+def uninstall_hooks(hooks_location, directory):
+    for path in [os.path.join(hooks_location, name) for name in hook_names] + \
+            [os.path.join(directory, 'installed')]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+class DirtyQueue(object):
+    """ The ArenaTaskIDs of the local tasks of an arena that were added or
+        modified since they were last claimed by a sync, as queued by the
+        TaskWarrior hooks. Claimed ids return to the queue unless the sync
+        completes.
+    """
+
+    def __init__(self, directory, arena_name):
+        self.directory = directory
+        self.filename = os.path.join(
+            directory, urllib.parse.quote(arena_name, safe='') + '.queue')
+        self.claimed = {}
+
+    def complete_since(self, last_sync):
+        """ Returns True if the hooks queued every change since last_sync. """
+        try:
+            with open(os.path.join(self.directory, 'installed')) as f:
+                installed = f.read().strip()
+        except OSError:
+            return False
+        return bool(last_sync) and installed <= last_sync
+
+    def claim(self):
+        """ Takes all queued ArenaTaskIDs, including those claimed by an
+            interrupted sync, and returns them.
+        """
+        if os.path.isfile(self.filename):
+            os.replace(self.filename, '%s.%s.claimed' % (self.filename,
+                                                         uuid.uuid4().hex))
+        ids = set()
+        for claimed in glob.glob(glob.escape(self.filename) + '.*.claimed'):
+            with open(claimed, 'rb') as f:
+                data = f.read()
+            self.claimed[claimed] = len(data)
+            ids.update(line for line in data.decode('utf-8').split('\n')
+                       if line)
+        return sorted(ids)
+
+    def release(self, completed):
+        """ Drops the claimed ArenaTaskIDs if the sync completed and returns
+            them to the queue otherwise. Ids a hook wrote to a claimed file
+            after it was read are returned in any case.
+        """
+        for claimed, size in self.claimed.items():
+            with open(claimed, 'rb') as f:
+                if completed:
+                    f.seek(size)
+                data = f.read()
+            if data:
+                with open(self.filename, 'ab') as f:
+                    f.write(data)
+            os.remove(claimed)
+        self.claimed = {}
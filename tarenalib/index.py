@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+import os
+import sqlite3
+import threading
+
+data_files = ['pending.data', 'completed.data', 'undo.data']
+
+
+def data_signature(data_location):
+    """ Returns mtime and size of the data files in data_location, which
+        change whenever TaskWarrior writes to it.
+    """
+    result = []
+    for data_file in data_files:
+        try:
+            stat = os.stat(os.path.join(data_location, data_file))
+            result.append((stat.st_mtime_ns, stat.st_size))
+        except (OSError, TypeError):
+            result.append(None)
+    return tuple(result)
+
+
+class TaskIndex(object):
+    """ A persistent index mapping (data location, ArenaTaskID) to the uuid
+        and last seen modification time of the task in TaskWarrior. The
+        index of a data location is fresh as long as nobody but TaskArena
+        wrote to its data files. It also keeps the content hashes of all
+        arena tasks as of the last full export of a data location, updated
+        by the writes of TaskArena since.
+    """
+
+    def __init__(self, filename=None):
+        self.connection = None
+        self.lock = threading.Lock()
+        self.open(filename)
+
+    def open(self, filename):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+            if filename:
+                self.connection = sqlite3.connect(filename,
+                                                  check_same_thread=False)
+                self.connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS tasks (
+                        data_location TEXT,
+                        arena_task_id TEXT,
+                        uuid TEXT,
+                        modified TEXT,
+                        PRIMARY KEY (data_location, arena_task_id));
+                    CREATE TABLE IF NOT EXISTS locations (
+                        data_location TEXT PRIMARY KEY,
+                        signature TEXT);
+                    CREATE TABLE IF NOT EXISTS hashes (
+                        data_location TEXT PRIMARY KEY,
+                        signature TEXT,
+                        hashes TEXT);
+                """)
+
+    @property
+    def enabled(self):
+        return self.connection is not None
+
+    @staticmethod
+    def key(data_location):
+        return os.path.abspath(os.path.expanduser(data_location))
+
+    def _signature(self, data_location):
+        row = self.connection.execute(
+            'SELECT signature FROM locations WHERE data_location = ?',
+            (self.key(data_location),)).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, data_location):
+        if not self.enabled:
+            return False
+        signature = data_signature(data_location)
+        if not any(signature):
+            return False
+        with self.lock:
+            return self._signature(data_location) == json.dumps(signature)
+
+    def record(self, data_location, entries, fresh=False, rebuild=False,
+               signature=None):
+        """ Stores entries of (ArenaTaskID, uuid, modified). If the index was
+            fresh before TaskArena wrote these entries, or the entries are a
+            complete rebuild, the index is marked fresh for the current state
+            of the data files.
+        """
+        if not self.enabled:
+            return
+        key = self.key(data_location)
+        if signature is None:
+            signature = data_signature(data_location)
+        with self.lock, self.connection:
+            if rebuild:
+                self.connection.execute(
+                    'DELETE FROM tasks WHERE data_location = ?', (key,))
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?)',
+                [(key, str(arena_task_id), uuid, modified)
+                 for arena_task_id, uuid, modified in entries])
+            if fresh or rebuild:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO locations VALUES (?, ?)',
+                    (key, json.dumps(signature)))
+            else:
+                self.connection.execute(
+                    'DELETE FROM locations WHERE data_location = ?', (key,))
+
+    def lookup(self, data_location, arena_task_ids):
+        """ Returns a dict mapping the given ArenaTaskIDs to uuids. Returns an
+            empty dict if the index of data_location is not fresh.
+        """
+        if not self.is_fresh(data_location):
+            return {}
+        key = self.key(data_location)
+        result = {}
+        with self.lock:
+            for arena_task_id in arena_task_ids:
+                row = self.connection.execute(
+                    'SELECT uuid FROM tasks '
+                    'WHERE data_location = ? AND arena_task_id = ?',
+                    (key, str(arena_task_id))).fetchone()
+                if row:
+                    result[arena_task_id] = row[0]
+        return result
+
+    def record_hashes(self, data_location, hashes, signature):
+        """ Stores hashes, a dict mapping arena names to dicts of ArenaTaskID
+            and content hash, for the data files with signature.
+        """
+        if not self.enabled or not any(signature):
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)',
+                (self.key(data_location), json.dumps(signature),
+                 json.dumps(hashes)))
+
+    def _hashes(self, data_location):
+        signature = data_signature(data_location)
+        if not any(signature):
+            return None
+        row = self.connection.execute(
+            'SELECT signature, hashes FROM hashes WHERE data_location = ?',
+            (self.key(data_location),)).fetchone()
+        if not row or row[0] != json.dumps(signature):
+            return None
+        return json.loads(row[1])
+
+    def hashes_are_fresh(self, data_location):
+        if not self.enabled:
+            return False
+        with self.lock:
+            return self._hashes(data_location) is not None
+
+    def update_hashes(self, data_location, hashes, fresh):
+        """ Updates the stored content hashes by hashes, a dict mapping arena
+            names to dicts of ArenaTaskID and content hash, after TaskArena
+            wrote these tasks. If the stored hashes were fresh before the
+            write, they are marked fresh for the current state of the data
+            files, otherwise they are dropped.
+        """
+        if not self.enabled:
+            return
+        key = self.key(data_location)
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                'SELECT hashes FROM hashes WHERE data_location = ?',
+                (key,)).fetchone()
+            signature = data_signature(data_location)
+            if not fresh or not row or not any(signature):
+                self.connection.execute(
+                    'DELETE FROM hashes WHERE data_location = ?', (key,))
+                return
+            stored = json.loads(row[0])
+            # a written task may have moved to another arena
+            for arena_hashes in hashes.values():
+                for tasks in stored.values():
+                    for arena_task_id in arena_hashes:
+                        tasks.pop(arena_task_id, None)
+            for arena, arena_hashes in hashes.items():
+                stored.setdefault(arena, {}).update(arena_hashes)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)',
+                (key, json.dumps(signature), json.dumps(stored)))
+
+    def content_hashes(self, data_location, arena_name):
+        """ Returns the stored content hashes of the tasks of arena_name in
+            data_location or None if its data files changed since.
+        """
+        if not self.enabled:
+            return None
+        with self.lock:
+            hashes = self._hashes(data_location)
+        return None if hashes is None else hashes.get(arena_name, {})
+
+task_index = TaskIndex()
@@ -19,7 +19,13 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 from tarenalib.arena import TaskEmperor
+from tarenalib.journal import fsync_directory
+import click
 import os
+import shutil
+import sys
+import tempfile
+import urllib.parse
 
 
 class IOManager(object):
@@ -30,11 +36,14 @@ class IOManager(object):
         self.configfile_name = configfile_name
 
     @staticmethod
-    def formatted_print(t):
-        print(u'{0:6}   {1:25}   {2:20}   {3:10}'.format(
+    def formatted_line(t):
+        return u'{0:6}   {1:25}   {2:20}   {3:10}'.format(
             t[0][0:6], t[1][0:25], t[2][0:20], t[3][0:10]
             )
-        )
+
+    @staticmethod
+    def formatted_print(t):
+        print(IOManager.formatted_line(t))
 
     @staticmethod
     def newlines(num):
@@ -61,6 +70,18 @@ class IOManager(object):
 
     configfile_name = property(_get_configfile_name, _set_configfile_name)
 
+    @property
+    def index_file_name(self):
+        return self.configfile_name + '.index'
+
+    @property
+    def dirty_queue_directory(self):
+        return self.configfile_name + '.dirty'
+
+    def journal_file_name(self, arena_name):
+        return os.path.join(self.configfile_name + '.journal',
+                            urllib.parse.quote(arena_name, safe='') + '.json')
+
     def send_message(self, msg, pre_blanks=0, post_blanks=0):
         if self.show_output:
             IOManager.newlines(pre_blanks)
@@ -70,6 +91,17 @@ class IOManager(object):
     def print_separator(self):
         self.send_message("-" * self.seplength)
 
+    def write(self, lines, pager=False):
+        """ Shows lines with a single write or through a pager. """
+        if not self.show_output:
+            return
+        text = ''.join(line + '\n' for line in lines)
+        if pager:
+            click.echo_via_pager(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
     def get_task_emperor(self):
         te = TaskEmperor()
         if os.path.isfile(self.configfile_name):
@@ -88,8 +120,26 @@ class IOManager(object):
         f.close()
         return te
 
-    def save_task_emperor(self, te):
-        f = open(self.configfile_name, 'w+')
-        te.save(f)
-        self.send_message("Saved.")
-        f.close()
+    def save_task_emperor(self, te, quiet=False):
+        """ Replaces the config file atomically, so that it is never left
+            truncated if tarena is killed while saving.
+        """
+        directory = os.path.dirname(os.path.abspath(self.configfile_name))
+        fd, temporary = tempfile.mkstemp(
+            dir=directory,
+            prefix=os.path.basename(self.configfile_name) + '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                te.save(f)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.isfile(self.configfile_name):
+                shutil.copymode(self.configfile_name, temporary)
+            os.replace(temporary, self.configfile_name)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        fsync_directory(self.configfile_name)
+        if not quiet:
+            self.send_message("Saved.")
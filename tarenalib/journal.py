@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+import os
+
+
+def fsync_directory(path):
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SyncJournal(object):
+    """ A write-ahead journal of the writes of one sync. Every entry holds
+        the complete data a task is written with, so replaying an entry
+        with ``task import`` is safe even if it was applied before.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = None
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    def write_line(self, data):
+        self.f.write(json.dumps(data) + '\n')
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def begin(self, header, entries):
+        """ Durably writes header and entries, each a dict with the side
+            written to, the ArenaTaskID and the data of the task.
+        """
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(directory, exist_ok=True)
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+            for number, entry in enumerate(entries):
+                f.write(json.dumps(dict(entry, number=number)) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.filename)
+        fsync_directory(self.filename)
+        self.f = open(self.filename, 'a')
+
+    def commit(self, numbers):
+        """ Marks the entries with the given numbers as applied. """
+        if numbers:
+            self.write_line({'committed': sorted(numbers)})
+
+    def pending(self):
+        """ Returns the header and all entries not yet marked as applied, or
+            None if there is no journal. A line cut short by a crash is
+            ignored.
+        """
+        if not self.exists():
+            return None
+        header = None
+        entries = {}
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    break
+                if header is None:
+                    header = data
+                elif 'committed' in data:
+                    for number in data['committed']:
+                        entries.pop(number, None)
+                else:
+                    entries[data['number']] = data
+        if header is None:
+            return None
+        return header, [entries[number] for number in sorted(entries)]
+
+    def finish(self):
+        """ Removes the journal once all of its entries are applied. """
+        if self.f:
+            self.f.close()
+            self.f = None
+        if self.exists():
+            os.remove(self.filename)
+            fsync_directory(self.filename)
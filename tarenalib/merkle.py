@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import hashlib
+
+
+def digest(lines):
+    h = hashlib.blake2b(digest_size=8)
+    for line in lines:
+        h.update(line.encode('utf-8') + b'\n')
+    return h.hexdigest()
+
+
+class MerkleTree(object):
+    """ A Merkle tree over the content hashes of the tasks of one side of an
+        arena. The leaves are buckets of tasks whose ArenaTaskIDs share a
+        prefix of depth characters, every inner node hashes its children.
+    """
+
+    def __init__(self, hashes, depth=2):
+        self.hashes = hashes
+        self.depth = depth
+        self.levels = [{} for _ in range(depth + 1)]
+        buckets = {}
+        for arena_task_id, content_hash in hashes.items():
+            buckets.setdefault(arena_task_id[:depth], []).append(
+                arena_task_id + ':' + content_hash)
+        self.levels[depth] = {prefix: digest(sorted(lines))
+                              for prefix, lines in buckets.items()}
+        for level in range(depth - 1, -1, -1):
+            children = {}
+            for prefix, node in self.levels[level + 1].items():
+                children.setdefault(prefix[:level], []).append(
+                    prefix + ':' + node)
+            self.levels[level] = {prefix: digest(sorted(lines))
+                                  for prefix, lines in children.items()}
+
+    @property
+    def root(self):
+        return self.levels[0].get('', '')
+
+    def diff(self, other):
+        """ Returns the sorted prefixes of all buckets that differ between
+            this tree and other, descending only into differing nodes.
+        """
+        if self.root == other.root:
+            return []
+        prefixes = set([''])
+        for level in range(1, self.depth + 1):
+            candidates = set(self.levels[level]) | set(other.levels[level])
+            prefixes = set(
+                prefix for prefix in candidates
+                if prefix[:level - 1] in prefixes and
+                self.levels[level].get(prefix) !=
+                other.levels[level].get(prefix))
+        return sorted(prefixes)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import datetime
+import json
+import threading
+
+winners = ['newest', 'local', 'remote', 'skip']
+
+
+def modified_key(task):
+    """ Orders tasks by their last modification, tasks without one being
+        the oldest.
+    """
+    modified = task.last_modified()
+    return modified is not None, modified
+
+
+class InvalidPolicy(Exception):
+    pass
+
+
+class Policy(object):
+    """ Resolves a synclist without asking. A policy consists of rules like
+
+            newest, local, remote or skip
+            project:<project>=<winner>
+            field:<field>=<winner>
+
+        Project rules take precedence over field rules, which take precedence
+        over the default rule. A field rule applies if its field differs; the
+        first applicable field rule decides. The default rule is newest.
+    """
+
+    def __init__(self, rules=[]):
+        self.default = 'newest'
+        self.projects = {}
+        self.fields = []
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        kind, _, spec = rule.partition(':')
+        if not spec:
+            self.default = self.check_winner(rule, kind)
+            return
+        key, _, winner = spec.partition('=')
+        if kind == 'project' and key:
+            self.projects[key] = self.check_winner(rule, winner)
+        elif kind == 'field' and key:
+            self.fields.append((key, self.check_winner(rule, winner)))
+        else:
+            raise InvalidPolicy('Invalid rule: ' + rule)
+
+    @staticmethod
+    def check_winner(rule, winner):
+        if winner not in winners:
+            raise InvalidPolicy('Invalid rule: ' + rule + ' (choose from ' +
+                                ', '.join(winners) + ')')
+        return winner
+
+    def project_rule(self, project):
+        while project:
+            if project in self.projects:
+                return 'project:' + project, self.projects[project]
+            project = project.rpartition('.')[0]
+        return None
+
+    def decide(self, e):
+        """ Returns the rule applying to e and the resulting action. """
+        task = e.local_task or e.remote_task
+        rule = self.project_rule(task['project'])
+        if rule is None and e.local_task and e.remote_task:
+            differing = set(e.fields or [])
+            rule = next((('field:' + field, winner)
+                         for field, winner in self.fields
+                         if field in differing), None)
+        if rule is None:
+            rule = (self.default, self.default)
+        name, winner = rule
+        if winner == 'skip':
+            return name, 'SKIP'
+        if not (e.local_task and e.remote_task):
+            return name, e.suggestion
+        if winner == 'local':
+            return name, 'UPLOAD'
+        elif winner == 'remote':
+            return name, 'DOWNLOAD'
+        if modified_key(e.local_task) >= modified_key(e.remote_task):
+            return name, 'UPLOAD'
+        return name, 'DOWNLOAD'
+
+    def resolve(self, synclist, arena_name=''):
+        """ Sets the action of every element of synclist in a single pass
+            and returns the decisions made.
+        """
+        decisions = []
+        for e in synclist:
+            rule, e.action = self.decide(e)
+            task = e.local_task or e.remote_task
+            decisions.append({'arena': arena_name,
+                              'ArenaTaskID': task.ArenaTaskID,
+                              'suggestion': e.suggestion,
+                              'action': e.action,
+                              'rule': rule,
+                              'fields': e.fields or []})
+        return decisions
+
+
+class DecisionLog(object):
+    """ Appends the decisions of a Policy to a file as JSON lines. """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+
+    def write(self, decisions):
+        with self.lock, open(self.filename, 'a') as f:
+            f.write(''.join(json.dumps(d, sort_keys=True) + '\n'
+                            for d in decisions))
+
+
+class InvalidCommand(Exception):
+    pass
+
+
+class BulkCommand(object):
+    """ A command of the manual sync that applies an action to all matching
+        elements at once, for instance
+
+            upload all where project:ops
+            skip all where only tags differ
+            download everything older than 30 days
+
+        Conditions are project:<project>, <field> differs, only <field>[,...]
+        differ, older than <n> days and newer than <n> days, joined by 'and'.
+    """
+
+    actions = {'u': 'UPLOAD', 'upload': 'UPLOAD',
+               'd': 'DOWNLOAD', 'download': 'DOWNLOAD',
+               's': 'SKIP', 'skip': 'SKIP'}
+
+    def __init__(self, text, now=None):
+        words = text.split()
+        if len(words) < 2 or words[0].lower() not in self.actions or \
+                words[1].lower() not in ['all', 'everything']:
+            raise InvalidCommand(
+                "Unknown command: " + text + ". Try e.g. 'upload all where "
+                "project:ops' or 'skip all where only tags differ'.")
+        self.action = self.actions[words[0].lower()]
+        self.now = now if now else datetime.datetime.now(
+            datetime.timezone.utc)
+        words = words[2:]
+        if words and words[0].lower() == 'where':
+            words = words[1:]
+        self.conditions = []
+        condition = []
+        for word in words + ['and']:
+            if word.lower() == 'and':
+                if condition:
+                    self.conditions.append(self.parse_condition(condition))
+                condition = []
+            else:
+                condition.append(word)
+
+    def parse_condition(self, words):
+        text = ' '.join(words)
+        lowered = [w.lower() for w in words]
+        if len(words) == 1 and lowered[0].startswith('project:'):
+            project = words[0][len('project:'):]
+            return lambda e: self.in_project(e, project)
+        if len(words) == 2 and lowered[1] in ['differs', 'differ']:
+            field = words[0]
+            return lambda e: field in (e.fields or [])
+        if len(words) == 3 and lowered[0] == 'only' and \
+                lowered[2] in ['differs', 'differ']:
+            fields = set(words[1].split(','))
+            return lambda e: bool(e.fields) and set(e.fields) <= fields
+        if len(words) == 4 and lowered[0] in ['older', 'newer'] and \
+                lowered[1] == 'than' and words[2].isdigit() and \
+                lowered[3] in ['day', 'days']:
+            limit = self.now - datetime.timedelta(days=int(words[2]))
+            if lowered[0] == 'older':
+                return lambda e: not self.newer(e, limit)
+            return lambda e: self.newer(e, limit)
+        raise InvalidCommand("Unknown condition: " + text)
+
+    @staticmethod
+    def in_project(e, project):
+        task = e.local_task or e.remote_task
+        value = (task['project'] if task else None) or ''
+        return value == project or value.startswith(project + '.')
+
+    @staticmethod
+    def last_modified(e):
+        return max((t.last_modified() for t in [e.local_task, e.remote_task]
+                    if t and t.last_modified() is not None), default=None)
+
+    @classmethod
+    def newer(cls, e, limit):
+        modified = cls.last_modified(e)
+        return modified is not None and modified >= limit
+
+    def possible(self, e):
+        if self.action == 'UPLOAD':
+            return bool(e.local_task)
+        elif self.action == 'DOWNLOAD':
+            return bool(e.remote_task)
+        return True
+
+    def apply(self, synclist):
+        """ Sets the action of all elements of synclist without an action
+            that match all conditions and returns their number.
+        """
+        matched = 0
+        for e in synclist:
+            if not e.action and (e.local_task or e.remote_task) and \
+                    self.possible(e) and \
+                    all(condition(e) for condition in self.conditions):
+                e.action = self.action
+                matched += 1
+        return matched
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import datetime
+import json
+import mmap
+import os
+import re
+
+date_fields = [
+    'due',
+    'end',
+    'entry',
+    'modified',
+    'scheduled',
+    'start',
+    'until',
+    'wait',
+]
+
+attribute_regex = re.compile(r'([^\s:"\[\]]+):"((?:[^"\\]|\\.)*)"')
+arena_regex = re.compile(br'(?:^\[|\s)Arena:"((?:[^"\\]|\\.)+)"')
+working_set_regex = re.compile(
+    br'(?:^\[|\s)status:"(?:pending|waiting|recurring)"')
+modified_after_regex = re.compile(r'^modified\.after:(\d{8}T\d{6}Z)$')
+
+legacy_escapes = [
+    ('&open;', '['),
+    ('&close;', ']'),
+    ('&dquot;', '"'),
+]
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+class DataFileReader(object):
+    """ Reads arena tasks directly from the pending.data and completed.data
+        files of a data location and returns them in the format of
+        ``task export``.
+    """
+
+    data_files = ['pending.data', 'completed.data']
+
+    def __init__(self, data_location):
+        self.data_location = data_location
+
+    @staticmethod
+    def format_date(value):
+        if not value.isdigit():
+            return value
+        return datetime.datetime.fromtimestamp(
+            int(value), datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    @staticmethod
+    def decode_value(raw):
+        value = json.loads('"' + raw + '"')
+        for escaped, char in legacy_escapes:
+            value = value.replace(escaped, char)
+        return value
+
+    @staticmethod
+    def parse_pattern(pattern):
+        """ Returns the modified.after timestamp of pattern, an empty string
+            for an empty pattern or raises UnsupportedFormat for any pattern
+            that cannot be evaluated without TaskWarrior.
+        """
+        modified_after = ''
+        for term in pattern:
+            match = modified_after_regex.match(term)
+            if not match:
+                raise UnsupportedFormat('Unsupported filter: ' + term)
+            modified_after = max(modified_after, match.group(1))
+        return modified_after
+
+    def parse_line(self, line):
+        line = line.strip()
+        if not (line.startswith('[') and line.endswith(']')):
+            raise UnsupportedFormat('Unexpected line: ' + line)
+        attrs = attribute_regex.findall(line[1:-1])
+        if ' '.join('%s:"%s"' % a for a in attrs) != line[1:-1]:
+            raise UnsupportedFormat('Unexpected line: ' + line)
+        data = {}
+        annotations = []
+        for key, raw in attrs:
+            value = self.decode_value(raw)
+            if key.startswith('annotation_'):
+                annotations.append({
+                    'entry': self.format_date(key[len('annotation_'):]),
+                    'description': value})
+            elif key in date_fields:
+                data[key] = self.format_date(value)
+            elif key == 'tags':
+                data[key] = value.split(',') if value else []
+            elif key == 'imask':
+                data[key] = float(value)
+            else:
+                data[key] = value
+        if annotations:
+            data['annotations'] = sorted(annotations,
+                                         key=lambda a: a['entry'])
+        return data
+
+    def read_file(self, data_file, modified_after='', working_set=False):
+        path = os.path.join(self.data_location, data_file)
+        if not os.path.getsize(path):
+            return
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                first_line = mm.readline().strip()
+                if not (first_line.startswith(b'[') and
+                        first_line.endswith(b']')):
+                    raise UnsupportedFormat('Unknown format: ' + path)
+                mm.seek(0)
+                task_id = 0
+                for line in iter(mm.readline, b''):
+                    # TaskWarrior numbers the pending, waiting and recurring
+                    # tasks of pending.data in order
+                    in_working_set = working_set and \
+                        bool(working_set_regex.search(line))
+                    if in_working_set:
+                        task_id += 1
+                    if b'Arena:"' not in line or not arena_regex.search(line):
+                        continue
+                    data = self.parse_line(line.decode('utf-8'))
+                    if modified_after and \
+                            data.get('modified', '') <= modified_after:
+                        continue
+                    data['id'] = task_id if in_working_set else 0
+                    yield data
+            finally:
+                mm.close()
+
+    def arena_tasks(self, pattern=[]):
+        """ Returns the raw data of all tasks with an Arena UDA matching
+            pattern. Raises UnsupportedFormat if the data location does not
+            contain data files in a known format.
+        """
+        modified_after = self.parse_pattern(pattern)
+        if not os.path.isfile(os.path.join(self.data_location,
+                                           'pending.data')):
+            raise UnsupportedFormat('No data files in ' + self.data_location)
+        result = []
+        for data_file in self.data_files:
+            if os.path.isfile(os.path.join(self.data_location, data_file)):
+                result += self.read_file(data_file, modified_after,
+                                         data_file == 'pending.data')
+        return result
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import http.client
+import json
+import select
+import threading
+import urllib.parse
+import tasklib.task as tlib
+
+scheme = 'tarena://'
+default_port = 8765
+read_only_commands = ['count', 'export']
+read_only_log_requests = ['end', 'exists', 'since']
+
+
+def is_remote(data_location):
+    return bool(data_location) and data_location.startswith(scheme)
+
+
+def parse_url(url):
+    """ Splits a tarena://host:port/name URL into host, port and name. """
+    parts = urllib.parse.urlsplit(url)
+    name = parts.path.strip('/')
+    if parts.scheme + '://' != scheme or not parts.hostname or not name:
+        raise ValueError('Invalid sync server URL: ' + url)
+    return parts.hostname, parts.port or default_port, name
+
+
+class ConnectionPool(object):
+    """ Keeps idle persistent connections to sync servers, so that every
+        request reuses an open connection where possible.
+    """
+
+    def __init__(self, timeout=60, retries=1):
+        self.timeout = timeout
+        self.retries = retries
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_dropped(connection):
+        """ Returns True if the server closed the idle connection, which
+            makes its socket readable.
+        """
+        if connection.sock is None:
+            return True
+        try:
+            return bool(select.select([connection.sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def get(self, host, port):
+        with self.lock:
+            connections = self.idle.get((host, port), [])
+            while connections:
+                connection = connections.pop()
+                if not self.is_dropped(connection):
+                    return connection, True
+                connection.close()
+        return http.client.HTTPConnection(host, port,
+                                          timeout=self.timeout), False
+
+    def put(self, host, port, connection):
+        with self.lock:
+            self.idle.setdefault((host, port), []).append(connection)
+
+    def request(self, host, port, method, path, body=None, idempotent=False):
+        """ Sends a request and returns the status and the decoded JSON
+            response. If a pooled connection fails, the request is sent
+            again on a new connection, at most retries times, but only if it
+            was not sent yet or is idempotent, so that no write is applied
+            twice.
+        """
+        headers = {'Content-Type': 'application/json'}
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+        attempt = 0
+        while True:
+            connection, reused = self.get(host, port)
+            sent = False
+            try:
+                connection.request(method, path, body, headers)
+                sent = True
+                response = connection.getresponse()
+                data = json.loads(response.read().decode('utf-8'))
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                if reused and attempt < self.retries and \
+                        (idempotent or not sent):
+                    attempt += 1
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            self.put(host, port, connection)
+            return response.status, data
+
+    def clear(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
+
+connection_pool = ConnectionPool()
+
+
+class RemoteTaskWarrior(object):
+    """ A stand-in for tasklib's TaskWarrior that executes all commands on a
+        data location served by ``tarena serve``. Several commands can be
+        sent in one request with execute_commands.
+    """
+
+    def __init__(self, url):
+        self.host, self.port, self.name = parse_url(url)
+        self.config = {'data.location': url}
+        self.tasks = tlib.TaskQuerySet(self)
+        self._version = None
+
+    filter_tasks = tlib.TaskWarrior.filter_tasks
+
+    @property
+    def path(self):
+        return '/' + urllib.parse.quote(self.name)
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = self.request('GET')['version']
+        return self._version
+
+    def enforce_recurrence(self):
+        # the server enforces recurrence before every export
+        pass
+
+    def request(self, method, body=None):
+        try:
+            status, data = connection_pool.request(
+                self.host, self.port, method, self.path, body,
+                self.is_read_only(method, body))
+        except (OSError, http.client.HTTPException, ValueError) as err:
+            raise tlib.TaskWarriorException(
+                'Sync server ' + self.config['data.location'] +
+                ' not reachable: ' + str(err))
+        if status != 200:
+            raise tlib.TaskWarriorException(data.get('error', str(status)))
+        return data
+
+    @staticmethod
+    def is_read_only(method, body):
+        if method == 'GET':
+            return True
+        for command in (body or {}).get('commands', []):
+            if 'log' in command:
+                if command['log'] not in read_only_log_requests:
+                    return False
+            elif not set(command.get('args', [])) & set(read_only_commands):
+                return False
+        return True
+
+    @staticmethod
+    def command(args):
+        if isinstance(args, dict):
+            return args
+        args = [str(arg) for arg in args]
+        if args[:1] == ['import']:
+            with open(args[1]) as f:
+                return {'args': ['import'], 'input': f.read()}
+        return {'args': args}
+
+    def change_log(self, arena_name):
+        return RemoteChangeLog(self, arena_name)
+
+    def execute_commands(self, commands, allow_failure=True):
+        """ Executes commands, a list of argument lists or change log
+            requests, with a single request and returns a list of their
+            outputs and errors. Execution stops at the first failing command.
+        """
+        results = self.request(
+            'POST', {'commands': [self.command(args)
+                                  for args in commands]})['results']
+        if allow_failure:
+            for result in results:
+                if result.get('error'):
+                    raise tlib.TaskWarriorException(result['error'])
+        return [(result.get('output', []), result.get('error', ''))
+                for result in results]
+
+    def execute_command(self, args, config_override={}, allow_failure=True,
+                        return_all=False):
+        output, error = self.execute_commands([args], allow_failure)[0]
+        if return_all:
+            return output, error.split('\n'), 1 if error else 0
+        return output
+
+
+class RemoteChangeLog(object):
+    """ The ChangeLog of an arena in a data location served by
+        ``tarena serve``.
+    """
+
+    def __init__(self, tw, arena_name):
+        self.tw = tw
+        self.arena_name = arena_name
+
+    def call(self, operation, **kwargs):
+        command = dict(kwargs, log=operation, arena=self.arena_name)
+        return self.tw.execute_commands([command])[0][0]
+
+    def exists(self):
+        return self.call('exists')
+
+    def append(self, entries):
+        return self.call('append', entries=entries)
+
+    def since(self, cursor=None):
+        entries, cursor = self.call('since', cursor=cursor)
+        return entries, cursor
+
+    def end(self):
+        return self.call('end')
+
+    def compact(self):
+        self.call('compact')
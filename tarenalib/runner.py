@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import asyncio
+import concurrent.futures
+import threading
+import tasklib.task as tlib
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class CommandCanceled(Exception):
+    pass
+
+
+class CommandRunner(object):
+    """ Runs commands as asyncio subprocesses on an event loop in a
+        background thread. At most concurrency commands run at a time for
+        the same key, usually a data location. A command running longer
+        than its timeout is killed, and cancel kills all running commands.
+    """
+
+    def __init__(self, concurrency=2, timeout=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.loop = None
+        self.semaphores = {}
+        self.futures = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever,
+                                 name='CommandRunner', daemon=True).start()
+            return self.loop
+
+    def semaphore(self, key):
+        # only called on the event loop, so no lock is needed
+        if key not in self.semaphores:
+            self.semaphores[key] = asyncio.Semaphore(self.concurrency)
+        return self.semaphores[key]
+
+    async def execute(self, args, key, input, timeout):
+        async with self.semaphore(key):
+            process = await asyncio.create_subprocess_exec(
+                *args, stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    process.communicate(input), timeout)
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
+        return (stdout.decode('utf-8'), stderr.decode('utf-8'),
+                process.returncode)
+
+    def submit(self, args, key=None, input=None, timeout=None):
+        """ Starts args and returns a future of its stdout, stderr and
+            return code.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future = asyncio.run_coroutine_threadsafe(
+            self.execute([str(arg) for arg in args], key, input, timeout),
+            self.start())
+        with self.lock:
+            self.futures.add(future)
+        future.add_done_callback(self.discard)
+        return future
+
+    def discard(self, future):
+        with self.lock:
+            self.futures.discard(future)
+
+    def result(self, future, args):
+        try:
+            return future.result()
+        except asyncio.TimeoutError:
+            raise CommandTimeout(' '.join(str(arg) for arg in args) +
+                                 ' timed out.')
+        except concurrent.futures.CancelledError:
+            raise CommandCanceled(' '.join(str(arg) for arg in args) +
+                                  ' was canceled.')
+        except BaseException:
+            future.cancel()
+            raise
+
+    def run(self, args, key=None, input=None, timeout=None):
+        """ Runs args and returns its stdout, stderr and return code. """
+        return self.result(self.submit(args, key, input, timeout), args)
+
+    def run_all(self, commands, timeout=None):
+        """ Runs commands, a list of (args, key, input), concurrently and
+            returns their results in order.
+        """
+        futures = [self.submit(args, key, input, timeout)
+                   for args, key, input in commands]
+        return [self.result(future, args)
+                for future, (args, key, input) in zip(futures, commands)]
+
+    def cancel(self):
+        """ Kills all running commands. """
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.cancel()
+
+command_runner = CommandRunner()
+
+
+class RunnerTaskWarrior(tlib.TaskWarrior):
+    """ A TaskWarrior running its commands with command_runner, keyed by its
+        data location. Timeouts and cancellations raise TaskWarriorException.
+    """
+
+    def run(self, args):
+        try:
+            return command_runner.run(
+                args, getattr(self, 'config', {}).get('data.location'))
+        except (CommandTimeout, CommandCanceled) as err:
+            raise tlib.TaskWarriorException(str(err))
+
+    def _get_version(self):
+        stdout, stderr, returncode = self.run(['task', '--version'])
+        return stdout.strip('\n')
+
+    def execute_command(self, args, config_override={}, allow_failure=True,
+                        return_all=False):
+        stdout, stderr, returncode = self.run(
+            self._get_command_args(args, config_override=config_override))
+        if returncode and allow_failure:
+            raise tlib.TaskWarriorException(stderr.strip() or stdout.strip())
+        if return_all:
+            return (stdout.rstrip().split('\n'),
+                    stderr.rstrip().split('\n'),
+                    returncode)
+        return stdout.rstrip().split('\n')
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+import os
+import re
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tasklib.task as tlib
+from tarenalib.arena import task_warrior_pool, uda_config_list
+from tarenalib.changelog import ChangeLog, change_log_file
+
+filter_regex = re.compile(r'^(\(|\)|or|and|--|\d+|[0-9a-f-]{36}|[+-]\w+|'
+                          r'[\w.]+:.*)$')
+
+commands = [
+    'add',
+    'count',
+    'delete',
+    'done',
+    'export',
+    'modify',
+    'start',
+    'stop',
+]
+
+
+class InvalidRequest(Exception):
+    pass
+
+
+def check_command(args):
+    """ Raises InvalidRequest unless args is a single TaskWarrior command
+        that TaskArena sends, preceded by filter terms only. Configuration
+        overrides and all other commands are rejected.
+    """
+    args = [str(arg) for arg in args]
+    position = next((i for i, arg in enumerate(args) if arg in commands),
+                    None)
+    if position is None:
+        raise InvalidRequest('Unsupported command: ' + ' '.join(args))
+    # TaskWarrior applies configuration overrides anywhere on the command
+    # line, so terms starting like one are rejected in every position
+    for term in args[:position] + args[position + 1:]:
+        if term.startswith(('rc.', 'rc:')) or not filter_regex.match(term):
+            raise InvalidRequest('Unsupported argument: ' + term)
+
+
+class SyncServer(ThreadingHTTPServer):
+    """ Serves data locations by name to RemoteTaskWarriors. Commands on the
+        same data location are executed one batch at a time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, locations):
+        ThreadingHTTPServer.__init__(self, address, SyncRequestHandler)
+        self.locations = locations
+        self.locks = {name: threading.Lock() for name in locations}
+
+    def warrior(self, name):
+        tw = task_warrior_pool.get(self.locations[name])
+        for uda in uda_config_list:
+            tw.config.update({uda[0]: uda[1]})
+        return tw
+
+    def change_log_request(self, name, command):
+        log = ChangeLog(change_log_file(self.locations[name],
+                                        str(command.get('arena', ''))))
+        operation = command['log']
+        if operation == 'exists':
+            return log.exists()
+        elif operation == 'append':
+            return log.append(command.get('entries', []))
+        elif operation == 'since':
+            return log.since(command.get('cursor'))
+        elif operation == 'end':
+            return log.end()
+        elif operation == 'compact':
+            return log.compact()
+        raise InvalidRequest('Unsupported change log request: ' +
+                             str(operation))
+
+    @staticmethod
+    def execute(tw, command):
+        args = [str(arg) for arg in command.get('args', [])]
+        if args == ['import']:
+            f = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+            try:
+                f.write(command.get('input', ''))
+                f.close()
+                return tw.execute_command(['import', f.name])
+            finally:
+                f.close()
+                os.remove(f.name)
+        check_command(args)
+        if 'export' in args:
+            tw.enforce_recurrence()
+        return tw.execute_command(args)
+
+    def execute_commands(self, name, commands):
+        results = []
+        with self.locks[name]:
+            tw = self.warrior(name)
+            for command in commands:
+                try:
+                    if 'log' in command:
+                        output = self.change_log_request(name, command)
+                    else:
+                        output = self.execute(tw, command)
+                    results.append({'output': output})
+                except (tlib.TaskWarriorException, InvalidRequest, OSError,
+                        ValueError) as err:
+                    results.append({'error': str(err)})
+                    break
+        return results
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def location(self):
+        name = urllib.parse.unquote(self.path.strip('/'))
+        if name not in self.server.locations:
+            self.send_json(404, {'error': 'Unknown data location: ' + name})
+            return None
+        return name
+
+    def do_GET(self):
+        name = self.location()
+        if name:
+            with self.server.locks[name]:
+                version = self.server.warrior(name).version
+            self.send_json(200, {'name': name, 'version': version})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        name = self.location()
+        if not name:
+            return
+        try:
+            commands = json.loads(body.decode('utf-8'))['commands']
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {'error': 'Invalid request.'})
+            return
+        self.send_json(200, {
+            'results': self.server.execute_commands(name, commands)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_locations(specs):
+    """ Parses NAME=DATA_LOCATION specifications into a dict. """
+    locations = {}
+    for spec in specs:
+        name, _, data_location = spec.partition('=')
+        if not name or not data_location:
+            raise InvalidRequest('Invalid data location: ' + spec)
+        locations[name] = data_location
+    return locations
@@ -18,22 +18,123 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+from tarenalib.arena import EnhancedTaskWarrior, TaskRecord, content_hash
+from tarenalib.index import task_index
 from tarenalib.io import IOManager
+from tarenalib.policy import BulkCommand, InvalidCommand, modified_key
+from tarenalib.remote import is_remote
+from tarenalib.runner import command_runner
+from tarenalib.trace import Tracer
+from concurrent.futures import ThreadPoolExecutor
+import tasklib.task as tlib
+import itertools
+import os
+import threading
+import time
+
+
+class DataLocationLocks(object):
+    """ Hands out one lock per data location, so that arenas sharing a
+        data location never write to it at the same time.
+    """
+
+    def __init__(self):
+        self.locks = {}
+        self.guard = threading.Lock()
+
+    def get(self, data_location):
+        key = os.path.realpath(os.path.expanduser(data_location))
+        with self.guard:
+            return key, self.locks.setdefault(key, threading.Lock())
+
+    def acquire(self, *data_locations):
+        locks = dict(self.get(d) for d in data_locations if d)
+        acquired = [locks[key] for key in sorted(locks)]
+        for lock in acquired:
+            lock.acquire()
+        return acquired
+
+    @staticmethod
+    def release(acquired):
+        for lock in reversed(acquired):
+            lock.release()
+
+data_location_locks = DataLocationLocks()
+
+
+def sync_arenas(task_emperor, io_manager, jobs=4, batch=False, full=False,
+                tracer=None, chunk_size=0, checkpoint=None, journal=None,
+                policy=None, decision_log=None, dirty_queue=None):
+    """ Syncs all arenas of task_emperor without asking, running up to jobs
+        syncs at the same time. journal and dirty_queue return the
+        SyncJournal and the DirtyQueue of an arena.
+        Returns the names of the arenas whose last sync watermark was
+        advanced.
+    """
+    def sync_arena(arena):
+        try:
+            return SyncManager(arena, io_manager, batch, interactive=False,
+                               tracer=tracer, chunk_size=chunk_size,
+                               checkpoint=checkpoint,
+                               journal=journal(arena) if journal else None,
+                               policy=policy, decision_log=decision_log,
+                               dirty_queue=dirty_queue(arena)
+                               if dirty_queue else None).sync(full)
+        except Exception as err:
+            io_manager.send_message(
+                "Sync of arena " + arena.name + " failed: " + str(err))
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        try:
+            results = list(executor.map(sync_arena, task_emperor.arenas))
+        except BaseException:
+            # kill running task commands, so the other syncs fail fast
+            command_runner.cancel()
+            raise
+    return [arena.name for arena, synced in zip(task_emperor.arenas, results)
+            if synced]
 
 
 class SyncManager(object):
-    def __init__(self, arena, io_manager):
+
+    hex_digits = '0123456789abcdef'
+    # the prefix of the chunk of ArenaTaskIDs not starting with a hex digit,
+    # which sorts after all hex prefixes
+    other_prefix = 'g'
+
+    def __init__(self, arena, io_manager, batch=False, interactive=True,
+                 tracer=None, chunk_size=0, checkpoint=None, journal=None,
+                 policy=None, decision_log=None, dirty_queue=None):
         self.arena = arena
+        self.dirty_queue = dirty_queue
+        self.policy = policy
+        self.decision_log = decision_log
+        self.journal = journal
+        self.started = None
+        self.change_cursor = None
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
         self.synclist = []
-        self.siom = SyncIOManager(io_manager)
+        self.tracer = tracer if tracer else Tracer(enabled=False)
+        self.siom = SyncIOManager(io_manager, self.tracer)
+        self.batch = batch
+        self.interactive = interactive
+        self.export_times = {'local': 0.0, 'remote': 0.0}
 
     @property
     def synclist_not_skipped(self):
         return [e for e in self.synclist if e.suggestion != 'SKIP']
 
     def generate_synclist(self, local_tasks, remote_tasks):
+        remote_index = {}
+        for rtask in remote_tasks:
+            remote_index.setdefault(rtask.ArenaTaskID, rtask)
+        local_ids = set()
         for ltask in local_tasks:
-            rtask = next((t for t in remote_tasks if t == ltask), None)
+            arena_task_id = ltask.ArenaTaskID
+            local_ids.add(arena_task_id)
+            rtask = remote_index.get(arena_task_id)
             if rtask:
                 self.synclist.append(SyncElement(
                     ltask,
@@ -43,7 +144,7 @@ class SyncManager(object):
             else:
                 self.synclist.append(SyncElement(ltask, None, None, 'UPLOAD'))
         for rtask in remote_tasks:
-            if rtask not in local_tasks:
+            if rtask.ArenaTaskID not in local_ids:
                 self.synclist.append(SyncElement(None, rtask, None, 'DOWNLOAD'))
 
     def suggest_conflict_resolution(self):
@@ -51,7 +152,8 @@ class SyncManager(object):
         for e in self.synclist:
             if e.suggestion == 'CONFLICT':
                 if e.fields:
-                    if e.local_task.last_modified() >= e.remote_task.last_modified():
+                    if modified_key(e.local_task) >= \
+                            modified_key(e.remote_task):
                         e.suggestion = 'UPLOAD'
                     else:
                         e.suggestion = 'DOWNLOAD'
@@ -60,37 +162,467 @@ class SyncManager(object):
                 simplified_synclist.append(e)
         self.synclist = simplified_synclist
 
+    def prepare_write(self, elem):
+        if elem.action == 'UPLOAD':
+            if elem.remote_task:
+                elem.remote_task.update(elem.local_task)
+            else:
+                elem.remote_task = self.arena.tw_remote.add_task(
+                    elem.local_task)
+                elem.remote_task.ArenaTaskID = elem.local_task.ArenaTaskID
+            return elem.remote_task
+        elif elem.action == 'DOWNLOAD':
+            if elem.local_task:
+                elem.local_task.update(elem.remote_task)
+            else:
+                elem.local_task = self.arena.tw_local.add_task(
+                    elem.remote_task)
+                elem.local_task.ArenaTaskID = elem.remote_task.ArenaTaskID
+            return elem.local_task
+
+    def materialize(self):
+        """ Replaces the TaskRecords of all elements to be written by full
+            tasks, loading them with as few exports as possible.
+        """
+        elements = [e for e in self.synclist
+                    if e.action in ['UPLOAD', 'DOWNLOAD']]
+        for side, etw in [('local_task', self.arena.tw_local),
+                          ('remote_task', self.arena.tw_remote)]:
+            records = [getattr(e, side) for e in elements
+                       if isinstance(getattr(e, side), TaskRecord)]
+            if not records:
+                continue
+            tasks = etw.shared_tasks(records)
+            for e in elements:
+                record = getattr(e, side)
+                if isinstance(record, TaskRecord):
+                    if record.uuid in tasks:
+                        setattr(e, side, tasks[record.uuid])
+                    else:
+                        e.error = 'Task no longer exists.'
+
+    def target(self, elem):
+        if elem.action == 'UPLOAD':
+            return 'remote', self.arena.tw_remote
+        return 'local', self.arena.tw_local
+
+    def begin_journal(self, writes):
+        """ Records the data of every task about to be written in the
+            journal before anything is written.
+        """
+        if not self.journal:
+            return
+        complete = all(e.action in ['UPLOAD', 'DOWNLOAD']
+                       for e in self.synclist)
+        self.journal.begin(
+            {'arena': self.arena.name,
+             'started': self.started if complete else None,
+             'exported': self.started},
+            [{'side': self.target(elem)[0],
+              'ArenaTaskID': task.ArenaTaskID,
+              'data': EnhancedTaskWarrior.import_data_of(task)}
+             for elem, task in writes])
+
+    def commit(self, numbers):
+        if self.journal:
+            self.journal.commit(numbers)
+
     def carry_out_sync(self):
-        for elem in self.synclist:
-            if elem.action == 'UPLOAD':
-                if elem.remote_task:
-                    elem.remote_task.update(elem.local_task)
+        locks = data_location_locks.acquire(self.arena.local_data,
+                                            self.arena.remote_data)
+        try:
+            with self.tracer.span('carry_out_sync', arena=self.arena.name):
+                self.materialize()
+                writes = []
+                for elem in self.synclist:
+                    task = None if elem.error else self.prepare_write(elem)
+                    if task:
+                        writes.append((elem, task))
+                self.begin_journal(writes)
+                # a sync server receives all writes in one request
+                if self.batch or is_remote(self.arena.remote_data):
+                    self.carry_out_batch_sync(writes)
                 else:
-                    elem.remote_task = self.arena.tw_remote.add_task(
-                        elem.local_task)
-                    elem.remote_task.ArenaTaskID = elem.local_task.ArenaTaskID
-                elem.remote_task.save()
-            elif elem.action == 'DOWNLOAD':
-                if elem.local_task:
-                    elem.local_task.update(elem.remote_task)
-                else:
-                    elem.local_task = self.arena.tw_local.add_task(
-                        elem.remote_task)
-                    elem.local_task.ArenaTaskID = elem.remote_task.ArenaTaskID
-                elem.local_task.save()
+                    for number, (elem, task) in enumerate(writes):
+                        if self.journal:
+                            # the journal assigned a uuid to new tasks,
+                            # which only task import can create
+                            self.target(elem)[1].import_tasks([task])
+                        else:
+                            task.save()
+                        self.commit([number])
+                self.log_changes([EnhancedTaskWarrior.import_data_of(task)
+                                  for elem, task in writes
+                                  if elem.action == 'UPLOAD' and
+                                  not elem.error])
+                if self.journal:
+                    self.journal.finish()
+        finally:
+            data_location_locks.release(locks)
+
+    def carry_out_batch_sync(self, writes):
+        for action in ['UPLOAD', 'DOWNLOAD']:
+            elements = [(number, elem, task)
+                        for number, (elem, task) in enumerate(writes)
+                        if elem.action == action]
+            if not elements:
+                continue
+            etw = self.arena.tw_remote if action == 'UPLOAD' \
+                else self.arena.tw_local
+            self.import_elements(etw, [(e, task)
+                                       for number, e, task in elements])
+            self.commit([number for number, e, task in elements
+                         if not e.error])
+        self.siom.report_failures(self.synclist)
+
+    def replay_journal(self):
+        """ Applies all writes of an interrupted sync that are not marked as
+            applied in the journal. Returns None if there is nothing to
+            replay and otherwise True if the last sync watermark was
+            advanced.
+        """
+        pending = self.journal.pending() if self.journal else None
+        if pending is None:
+            return None
+        header, entries = pending
+        locks = data_location_locks.acquire(self.arena.local_data,
+                                            self.arena.remote_data)
+        replayed = []
+        try:
+            with self.tracer.span('replay_journal', arena=self.arena.name):
+                for side, etw in [('local', self.arena.tw_local),
+                                  ('remote', self.arena.tw_remote)]:
+                    side_entries = self.unchanged_entries(
+                        etw, [e for e in entries if e['side'] == side],
+                        header.get('exported') or header.get('started'))
+                    if side_entries:
+                        etw.import_data([e['data'] for e in side_entries])
+                    replayed += side_entries
+                self.log_changes([e['data'] for e in replayed
+                                  if e['side'] == 'remote'])
+                self.journal.finish()
+        finally:
+            data_location_locks.release(locks)
+        self.siom.iom.send_message(
+            "Replayed %d writes of an interrupted sync of %s." %
+            (len(replayed), self.arena.name))
+        if len(replayed) < len(entries):
+            self.siom.iom.send_message(
+                "Skipped %d writes of tasks changed since." %
+                (len(entries) - len(replayed)))
+        if header.get('started'):
+            self.arena.last_sync = header['started']
+            return True
+        return False
+
+    def unchanged_entries(self, etw, entries, exported):
+        """ Returns the journal entries whose task was not modified after
+            the export the interrupted sync was based on. Replaying the
+            others would revert changes made since.
+        """
+        if not entries or not exported:
+            return entries
+        modified = {task.ArenaTaskID: task.modified for task in
+                    etw.tasks_by_arena_task_ids(
+                        [e['ArenaTaskID'] for e in entries],
+                        ['Arena:' + self.arena.name], records=True)}
+        return [e for e in entries
+                if (modified.get(str(e['ArenaTaskID'])) or '') <= exported]
+
+    def log_changes(self, data_list):
+        """ Appends the tasks written to the remote side to its change log.
+            The change cursor skips them unless others wrote in between.
+        """
+        log = self.arena.tw_remote.change_log() if data_list else None
+        if not log:
+            return
+        cursor = log.append([{'ArenaTaskID': str(data['ArenaTaskID']),
+                              'modified': data.get('modified'),
+                              'hash': content_hash(data)}
+                             for data in data_list])
+        # without a log at the start of the sync, the cursor is only
+        # adopted if the log holds nothing but these entries
+        sequence = self.change_cursor['sequence'] if self.change_cursor \
+            else 0
+        if sequence == cursor['sequence'] - len(data_list):
+            self.change_cursor = cursor
+
+    @staticmethod
+    def import_elements(etw, elements):
+        if not elements:
+            return
+        try:
+            etw.import_tasks([task for e, task in elements])
+        except tlib.TaskWarriorException:
+            # task import is idempotent by uuid, so retrying every element
+            # on its own isolates the failing ones
+            for e, task in elements:
+                try:
+                    etw.import_tasks([task])
+                except tlib.TaskWarriorException as err:
+                    e.error = str(err)
 
     def process_user_modified_synclist(self):
-        self.synclist = self.siom.user_checks_synclist(self.synclist,
-                                                       self.arena.name)
+        if self.policy:
+            self.synclist = self.siom.apply_policy(
+                self.synclist, self.arena.name, self.policy,
+                self.decision_log)
+        elif self.interactive:
+            self.synclist = self.siom.user_checks_synclist(self.synclist,
+                                                           self.arena.name)
+        else:
+            self.synclist = self.siom.accept_suggestions(self.synclist,
+                                                         self.arena.name)
+        if self.synclist is None:
+            return True
         if self.synclist:
             self.carry_out_sync()
             self.siom.iom.send_message("Sync complete.", 1, 1)
+            return all(e.action in ['UPLOAD', 'DOWNLOAD'] and not e.error
+                       for e in self.synclist)
+        return False
+
+    def timed_export(self, side, export):
+        start = time.perf_counter()
+        try:
+            with self.tracer.span('export ' + side, arena=self.arena.name):
+                return export()
+        finally:
+            self.export_times[side] += time.perf_counter() - start
+
+    def export_both_sides(self, local_export, remote_export):
+        """ Runs the local and the remote export at the same time. """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            local_future = executor.submit(self.timed_export, 'local',
+                                           local_export)
+            remote_future = executor.submit(self.timed_export, 'remote',
+                                            remote_export)
+            return local_future.result(), remote_future.result()
+
+    def export_differing_buckets(self, local_tree, remote_tree):
+        """ Compares the Merkle trees of both sides and exports only the
+            tasks in buckets that differ, nothing if the roots are equal.
+        """
+        prefixes = local_tree.diff(remote_tree)
+        self.tracer.count('buckets.differing', len(prefixes))
+        if not prefixes:
+            return [], []
+        return self.export_both_sides(
+            lambda: self.arena.get_local_tasks_in_buckets(prefixes, True),
+            lambda: self.arena.get_remote_tasks_in_buckets(prefixes, True))
+
+    def claim_dirty_tasks(self):
+        """ Claims the queued ArenaTaskIDs of locally changed tasks. Returns
+            them if the queue holds every change since the last sync and
+            None otherwise.
+        """
+        if not self.dirty_queue:
+            return None
+        arena_task_ids = self.dirty_queue.claim()
+        if not self.dirty_queue.complete_since(self.arena.last_sync):
+            return None
+        self.tracer.count('changes.local', len(arena_task_ids))
+        return arena_task_ids
+
+    def export_local_changes(self, dirty):
+        if dirty is None:
+            return self.arena.get_local_tasks(
+                ['modified.after:' + self.arena.last_sync], True)
+        return self.arena.get_local_tasks_by_ids(dirty, True) \
+            if dirty else []
+
+    def export_remote_changes(self, change_log):
+        if change_log is None:
+            return self.arena.get_remote_tasks(
+                ['modified.after:' + self.arena.last_sync], True)
+        entries, self.change_cursor = change_log.since(
+            self.arena.change_cursor)
+        self.tracer.count('changes.remote', len(entries))
+        remote_ids = set(e['ArenaTaskID'] for e in entries)
+        return self.arena.get_remote_tasks_by_ids(remote_ids, True) \
+            if remote_ids else []
+
+    def export_counterparts(self, local_tasks, remote_tasks):
+        """ Adds the tasks missing on either side to the exported tasks. """
+        local_ids = set(t.ArenaTaskID for t in local_tasks)
+        remote_ids = set(t.ArenaTaskID for t in remote_tasks)
+        if local_ids ^ remote_ids:
+            local_missing, remote_missing = self.export_both_sides(
+                lambda: self.arena.get_local_tasks_by_ids(
+                    remote_ids - local_ids, True)
+                if remote_ids - local_ids else [],
+                lambda: self.arena.get_remote_tasks_by_ids(
+                    local_ids - remote_ids, True)
+                if local_ids - remote_ids else [])
+            local_tasks += local_missing
+            remote_tasks += remote_missing
+        return local_tasks, remote_tasks
+
+    def export_tasks(self, full=False):
+        """ Exports the tasks to be synced from both sides. Unless a full
+            export is requested, only the local tasks queued by the hooks
+            and the remote tasks written since the change cursor of the
+            arena are exported where these are available, only tasks in
+            buckets whose content hashes differ if the task index holds
+            fresh hashes of both sides, and only tasks modified since the
+            last sync otherwise.
+            Changed tasks are exported together with their counterparts on
+            the other side.
+        """
+        self.export_times = {'local': 0.0, 'remote': 0.0}
+        dirty = self.claim_dirty_tasks()
+        change_log = self.arena.tw_remote.change_log()
+        self.change_cursor = change_log.end() if change_log else None
+        if not (self.arena.change_cursor and self.change_cursor):
+            change_log = None
+        if not full and self.arena.last_sync and \
+                (dirty is not None or change_log):
+            return self.export_counterparts(*self.export_both_sides(
+                lambda: self.export_local_changes(dirty),
+                lambda: self.export_remote_changes(change_log)))
+        if not full and task_index.enabled:
+            trees = self.export_both_sides(
+                self.arena.tw_local.indexed_merkle_tree,
+                self.arena.tw_remote.indexed_merkle_tree)
+            if None not in trees:
+                return self.export_differing_buckets(*trees)
+        if full or not self.arena.last_sync:
+            return self.export_both_sides(
+                lambda: self.arena.get_local_tasks(records=True),
+                lambda: self.arena.get_remote_tasks(records=True))
+        changed = ['modified.after:' + self.arena.last_sync]
+        return self.export_counterparts(*self.export_both_sides(
+            lambda: self.arena.get_local_tasks(changed, True),
+            lambda: self.arena.get_remote_tasks(changed, True)))
 
-    def sync(self):
-        self.generate_synclist(self.arena.get_local_tasks(),
-                               self.arena.get_remote_tasks())
-        self.suggest_conflict_resolution()
-        self.process_user_modified_synclist()
+    @property
+    def canceled(self):
+        return self.synclist is not None and \
+            not any(e.action for e in self.synclist)
+
+    def prefix_chunks(self):
+        """ Splits the ArenaTaskIDs into consecutive groups of prefixes, each
+            holding about chunk_size tasks of the larger side. If any
+            ArenaTaskID does not start with a hex digit, a last chunk holds
+            all of these.
+        """
+        counts = []
+        for etw in [self.arena.tw_local, self.arena.tw_remote]:
+            total = etw.count_arena_tasks()
+            counts.append((total, total - etw.count_arena_tasks(
+                etw.or_filter('ArenaTaskID.startswith:' + digit
+                              for digit in self.hex_digits))))
+        num_tasks = max(max(total for total, _ in counts), 1)
+        depth = 1
+        while depth < 4 and num_tasks > self.chunk_size * 16 ** depth:
+            depth += 1
+        prefixes = [''.join(p) for p in
+                    itertools.product(self.hex_digits, repeat=depth)]
+        per_chunk = max(1, self.chunk_size * len(prefixes) // num_tasks)
+        chunks = [prefixes[i:i + per_chunk]
+                  for i in range(0, len(prefixes), per_chunk)]
+        if any(others for _, others in counts):
+            chunks.append([self.other_prefix])
+        return chunks
+
+    def stream_chunk(self, etw, prefixes):
+        if prefixes == [self.other_prefix]:
+            return etw.stream_arena_tasks(self.hex_digits, invert=True)
+        return etw.stream_arena_tasks(prefixes)
+
+    @staticmethod
+    def is_done(prefix, cursor):
+        """ Returns True if all ArenaTaskIDs starting with prefix sort before
+            or at the prefix cursor.
+        """
+        padded = prefix + 'f' * (len(cursor) - len(prefix))
+        return padded[:len(cursor)] <= cursor
+
+    def save_checkpoint(self):
+        if self.checkpoint:
+            self.checkpoint()
+
+    def sync_chunks(self):
+        """ Syncs the arena in ArenaTaskID order, one chunk of about
+            chunk_size tasks at a time, and holds only the current chunk in
+            memory. The last completed chunk is saved in the sync cursor of
+            the arena, so that an interrupted sync resumes after it. Returns
+            True if the last sync watermark was advanced.
+        """
+        if self.arena.sync_cursor:
+            cursor = self.arena.sync_cursor
+        else:
+            change_log = self.arena.tw_remote.change_log()
+            cursor = {'started': self.arena.watermark(), 'prefix': '',
+                      'changes': change_log.end() if change_log else None}
+        self.change_cursor = cursor.get('changes')
+        completed = True
+        for prefixes in self.prefix_chunks():
+            if cursor['prefix'] and self.is_done(prefixes[-1],
+                                                 cursor['prefix']):
+                continue
+            self.synclist = []
+            with self.tracer.span('export', arena=self.arena.name):
+                local_tasks, remote_tasks = self.export_both_sides(
+                    lambda: self.stream_chunk(self.arena.tw_local, prefixes),
+                    lambda: self.stream_chunk(self.arena.tw_remote,
+                                              prefixes))
+            self.siom.report_export(len(local_tasks), len(remote_tasks),
+                                    self.export_times)
+            with self.tracer.span('generate_synclist', arena=self.arena.name):
+                self.generate_synclist(local_tasks, remote_tasks)
+            del local_tasks, remote_tasks
+            with self.tracer.span('suggest_conflict_resolution',
+                                  arena=self.arena.name):
+                self.suggest_conflict_resolution()
+            chunk_completed = self.process_user_modified_synclist()
+            if self.interactive and self.canceled:
+                return False
+            completed = completed and chunk_completed
+            if completed:
+                cursor['prefix'] = prefixes[-1]
+                cursor['changes'] = self.change_cursor
+                self.arena.sync_cursor = cursor
+                self.save_checkpoint()
+        self.synclist = []
+        if completed:
+            self.arena.sync_cursor = None
+            self.arena.last_sync = cursor['started']
+            self.arena.change_cursor = cursor.get('changes')
+            self.save_checkpoint()
+        return completed
+
+    def sync(self, full=False):
+        """ Syncs the arena and returns True if the last sync watermark
+            was advanced. The writes of an interrupted sync are replayed
+            first.
+        """
+        self.tracer.instrument(self.arena.tw_local.tw)
+        self.tracer.instrument(self.arena.tw_remote.tw)
+        self.replay_journal()
+        if self.chunk_size:
+            return self.sync_chunks()
+        started = self.started = self.arena.watermark()
+        self.synclist = []
+        with self.tracer.span('export', arena=self.arena.name):
+            local_tasks, remote_tasks = self.export_tasks(full)
+        self.siom.report_export(len(local_tasks), len(remote_tasks),
+                                self.export_times)
+        with self.tracer.span('generate_synclist', arena=self.arena.name):
+            self.generate_synclist(local_tasks, remote_tasks)
+        with self.tracer.span('suggest_conflict_resolution',
+                              arena=self.arena.name):
+            self.suggest_conflict_resolution()
+        completed = self.process_user_modified_synclist()
+        for elem in self.synclist or []:
+            self.tracer.count('elements.' + (elem.action or 'NONE'))
+        if self.dirty_queue:
+            self.dirty_queue.release(completed)
+        if completed:
+            self.arena.last_sync = started
+            self.arena.change_cursor = self.change_cursor
+            return True
+        return False
 
     def __repr__(self):
         return str({'arena:': self.arena.__str__(),
@@ -102,6 +634,10 @@ class SyncManager(object):
 
 
 class SyncElement(object):
+
+    __slots__ = ['local_task', 'remote_task', 'suggestion', 'action', 'fields',
+                 'error']
+
     def __init__(self, ltask=None, rtask=None, fields=None, suggestion='',
                  action=''):
         self.local_task = ltask
@@ -109,15 +645,15 @@ class SyncElement(object):
         self.suggestion = suggestion
         self.action = action
         self.fields = fields
+        self.error = None
 
     @property
     def local_description(self):
-        return self.local_task.tw_task['description'] if self.local_task else ''
+        return self.local_task['description'] if self.local_task else ''
 
     @property
     def remote_description(self):
-        return self.remote_task.tw_task[
-            'description'] if self.remote_task else ''
+        return self.remote_task['description'] if self.remote_task else ''
 
     @property
     def local_last_modified(self):
@@ -143,27 +679,66 @@ class SyncElement(object):
 
 
 class SyncIOManager(object):
-    def __init__(self, iom):
+    def __init__(self, iom, tracer=None, preview_limit=None, pager=False):
         self.iom = iom
+        self.tracer = tracer if tracer else Tracer(enabled=False)
+        self.preview_limit = preview_limit
+        self.pager = pager
 
-    def sync_preview(self, synclist):
-        self.iom.print_separator()
-        IOManager.formatted_print(('', 'Task', 'LastModified', 'Suggestion'))
-        self.iom.print_separator()
+    @staticmethod
+    def count_line(title, counts, limit=10):
+        ranked = sorted(counts.items(), key=lambda c: (-c[1], c[0]))
+        text = ', '.join('%s %d' % c for c in ranked[:limit])
+        if len(ranked) > limit:
+            text += ', ... (%d more)' % (len(ranked) - limit)
+        return '  {0:12}{1}'.format(title + ':', text)
+
+    def summary_lines(self, synclist):
+        """ Returns lines counting the elements of synclist by suggestion,
+            project and changed field.
+        """
+        suggestions, projects, fields = {}, {}, {}
         for e in synclist:
-            IOManager.formatted_print((
-                'Local',
-                e.local_description,
-                e.local_last_modified,
-                ''
-            ))
-            IOManager.formatted_print((
-                'Remote',
-                e.remote_description,
-                e.remote_last_modified,
-                e.suggestion
-            ))
-            self.iom.print_separator()
+            suggestions[e.suggestion] = suggestions.get(e.suggestion, 0) + 1
+            task = e.local_task or e.remote_task
+            project = (task['project'] if task else None) or '(none)'
+            projects[project] = projects.get(project, 0) + 1
+            for field in e.fields or []:
+                fields[field] = fields.get(field, 0) + 1
+        lines = ['Summary of %d tasks' % len(synclist),
+                 self.count_line('Suggestion', suggestions),
+                 self.count_line('Project', projects)]
+        if fields:
+            lines.append(self.count_line('Field', fields))
+        return lines
+
+    def sync_preview(self, synclist):
+        with self.tracer.span('sync_preview'):
+            separator = '-' * self.iom.seplength
+            lines = [separator] + self.summary_lines(synclist)
+            shown = synclist if self.preview_limit is None \
+                else synclist[:self.preview_limit]
+            if shown:
+                lines += [separator,
+                          IOManager.formatted_line(('', 'Task', 'LastModified',
+                                                    'Suggestion')),
+                          separator]
+            for e in shown:
+                lines += [IOManager.formatted_line((
+                              'Local',
+                              e.local_description,
+                              e.local_last_modified,
+                              '')),
+                          IOManager.formatted_line((
+                              'Remote',
+                              e.remote_description,
+                              e.remote_last_modified,
+                              e.suggestion)),
+                          separator]
+            if len(shown) < len(synclist):
+                lines.append('... and %d more tasks.' %
+                             (len(synclist) - len(shown)))
+            self.iom.write(lines, self.pager)
         return IOManager.get_input(
             "Do you want to sync (a)ll, sync (m)anually or (c)ancel? (a/m/c) ",
             1
@@ -172,7 +747,7 @@ class SyncIOManager(object):
     def sync_choice(self, e):
         if e.local_task:
             self.iom.send_message(
-                "Task Description: " + e.local_task.tw_task['description']
+                "Task Description: " + e.local_task['description']
             )
             self.iom.send_message(
                 "ArenaTaskID     : " + e.local_task.ArenaTaskID
@@ -194,10 +769,10 @@ class SyncIOManager(object):
                     "This would cause the following modifications:", 0, 1
                 )
                 for field in e.fields:
-                    local_field = str(e.local_task.tw_task[field]) \
-                        if e.local_task.tw_task[field] else '(empty)'
-                    remote_field = str(e.remote_task.tw_task[field]) \
-                        if e.remote_task.tw_task[field] else '(empty)'
+                    local_field = str(e.local_task[field]) \
+                        if e.local_task[field] else '(empty)'
+                    remote_field = str(e.remote_task[field]) \
+                        if e.remote_task[field] else '(empty)'
                     self.iom.send_message(
                         field + ": " + local_field +
                         (" -> " if e.suggestion == 'UPLOAD' else ' <- ') +
@@ -216,7 +791,7 @@ class SyncIOManager(object):
         elif e.remote_task:
             self.iom.print_separator()
             self.iom.send_message(
-                "Description: " + e.remote_task.tw_task['description'])
+                "Description: " + e.remote_task['description'])
             self.iom.send_message("ArenaTaskID: " + e.remote_task.ArenaTaskID)
             self.iom.send_message("This task does not yet exist on local.", 1)
             result = IOManager.get_input(
@@ -226,6 +801,59 @@ class SyncIOManager(object):
             result = None
         return result
 
+    def report_export(self, num_local, num_remote, export_times):
+        self.iom.send_message(
+            "Exported %d local tasks in %.2fs and %d remote tasks in %.2fs." %
+            (num_local, export_times['local'],
+             num_remote, export_times['remote']))
+
+    def report_failures(self, synclist):
+        for e in synclist:
+            if e.error:
+                task = e.local_task or e.remote_task
+                self.iom.send_message(
+                    "Failed to " + e.action.lower() + " " +
+                    str(task.ArenaTaskID) + ": " + e.error)
+
+    def apply_policy(self, synclist, arena_name, policy, decision_log=None):
+        if synclist:
+            decisions = policy.resolve(synclist, arena_name)
+            if decision_log:
+                decision_log.write(decisions)
+            counts = {}
+            for e in synclist:
+                counts[e.action] = counts.get(e.action, 0) + 1
+            self.iom.send_message(
+                "Resolved " + str(len(synclist)) + " tasks of " + arena_name +
+                " by policy: " + ", ".join(
+                    "%d %s" % (counts[action], action)
+                    for action in sorted(counts)) + ".")
+            return synclist
+        else:
+            self.iom.send_message("Arena " + arena_name + " is in sync.")
+
+    def bulk_decision(self, text, synclist):
+        try:
+            command = BulkCommand(text)
+        except InvalidCommand as err:
+            self.iom.send_message(str(err), 1)
+            return
+        matched = command.apply(synclist)
+        self.iom.send_message(
+            "Decided to " + command.action + " " + str(matched) + " tasks.",
+            1)
+
+    def accept_suggestions(self, synclist, arena_name):
+        if synclist:
+            self.iom.send_message(
+                "Syncing " + str(len(synclist)) + " tasks of " +
+                arena_name + "...")
+            for elem in synclist:
+                elem.action = elem.suggestion
+            return synclist
+        else:
+            self.iom.send_message("Arena " + arena_name + " is in sync.")
+
     def user_checks_synclist(self, synclist, arena_name):
         if synclist:
             self.iom.send_message(
@@ -238,9 +866,20 @@ class SyncIOManager(object):
                     elem.action = elem.suggestion
             elif sync_command == 'm':
                 self.iom.send_message("Starting manual sync...", 1, 1)
-                for elem in synclist:
+                self.iom.send_message(
+                    "Answer with a command like 'upload all where "
+                    "project:ops' to decide for all remaining tasks at once.")
+                for i, elem in enumerate(synclist):
+                    if elem.action:
+                        continue
                     self.iom.print_separator()
                     sc = self.sync_choice(elem)
+                    while sc and len(sc) > 1 and not elem.action:
+                        self.bulk_decision(sc, synclist[i:])
+                        if not elem.action:
+                            sc = self.sync_choice(elem)
+                    if elem.action:
+                        continue
                     if sc == 'u':
                         elem.action = 'UPLOAD'
                         self.iom.send_message("Task will be uploaded.", 1)
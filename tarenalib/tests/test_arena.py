@@ -19,11 +19,15 @@
 
 
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, Mock
 from io import StringIO
 
-from tarenalib.arena import TaskEmperor, TaskArena, EnhancedTaskWarrior, SharedTask, tw_attrs_editable
+from tarenalib.arena import TaskEmperor, TaskArena, EnhancedTaskWarrior, SharedTask, tw_attrs_editable, \
+    task_warrior_pool, ExportCache, ArenaTask, content_hash, TaskRecord
 import tasklib.task as tlib
+import os
+import shutil
+import tempfile
 
 
 class TestSharedTask(unittest.TestCase):
@@ -101,6 +105,55 @@ class TestSharedTask(unittest.TestCase):
         self.assertEqual(u'due' in fields, False)
 
 
+class TestArenaTask(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher1 = patch('tasklib.task.TaskWarrior')
+        self.MockClass1 = self.patcher1.start()
+
+    def tearDown(self):
+        self.patcher1.stop()
+
+    def arena_task(self, data):
+        task = ArenaTask(tlib.TaskWarrior())
+        task._load_data(data)
+        return SharedTask(task)
+
+    def test_content_hash(self):
+        data = {'description': 'paint walls', 'tags': ['home'],
+                'due': '20151010T100000Z', 'uuid': 'a1'}
+        task1 = self.arena_task(data)
+        task2 = self.arena_task(dict(data, uuid='a2'))
+        self.assertEqual(task1.content_hash(), content_hash(data))
+        task1.tw_task._content_hash = None
+        self.assertEqual(task1.content_hash(), content_hash(data))
+        self.assertEqual(task1.different_fields(task2), [])
+        task2.tw_task['description'] = 'clean floor'
+        self.assertNotEqual(task1.content_hash(), task2.content_hash())
+        self.assertEqual(task1.different_fields(task2), ['description'])
+        task1.update(task2)
+        self.assertEqual(task1.content_hash(), task2.content_hash())
+        self.assertIsNone(SharedTask({}).content_hash())
+
+
+class TestTaskRecord(unittest.TestCase):
+
+    def test_record(self):
+        data = {'ArenaTaskID': 'x1', 'uuid': 'a1', 'description': 'paint',
+                'tags': 'home', 'entry': '20151010T100000Z', 'annotations': []}
+        record = TaskRecord(data)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertRaises(AttributeError, setattr, record, 'project', 'foo')
+        self.assertEqual(record['tags'], ['home'])
+        self.assertIsNone(record['project'])
+        self.assertEqual(record.last_modified().timestamp(), 1444471200)
+        self.assertEqual(record.different_fields(TaskRecord(
+            dict(data, tags=['home'], project='', uuid='a2'))), [])
+        self.assertEqual(record.different_fields(TaskRecord(
+            dict(data, project='foo'))), ['project'])
+        self.assertEqual(record, TaskRecord({'ArenaTaskID': 'x1'}))
+
+
 class TestEnhancedTaskWarrior(unittest.TestCase):
     def setUp(self):
         self.patcher1 = patch('tasklib.task.TaskWarrior')
@@ -115,13 +168,72 @@ class TestEnhancedTaskWarrior(unittest.TestCase):
         self.assertEqual(type(etw), EnhancedTaskWarrior)
 
 
+class TestExportCache(unittest.TestCase):
+
+    def setUp(self):
+        self.data_location = tempfile.mkdtemp()
+        self.exports = []
+
+    def tearDown(self):
+        shutil.rmtree(self.data_location)
+
+    def export(self, pattern=[]):
+        self.exports.append(pattern)
+        return [{'Arena': 'a', 'description': 'paint walls'},
+                {'Arena': 'b', 'description': 'clean floor'},
+                {'Arena': 'a', 'description': 'do dishes'}]
+
+    def write_data(self, content):
+        with open(os.path.join(self.data_location, 'pending.data'), 'a') as f:
+            f.write(content)
+
+    def test_partitions(self):
+        cache = ExportCache()
+        etw = Mock(export_arena_tasks=self.export,
+                   data_location=self.data_location)
+        partitions = cache.partitions(etw)
+        self.assertEqual(len(partitions['a']), 2)
+        self.assertEqual(len(partitions['b']), 1)
+        cache.partitions(etw)
+        self.assertEqual(len(self.exports), 2)
+        self.write_data('[description:"paint walls"]\n')
+        cache.partitions(etw)
+        cache.partitions(etw)
+        self.assertEqual(len(self.exports), 3)
+        self.assertEqual(self.exports[0], [])
+        cache.partitions(etw, ['+home'])
+        self.assertEqual(self.exports[3], ['+home'])
+
+    def test_eviction(self):
+        cache = ExportCache()
+        etw = Mock(export_arena_tasks=self.export,
+                   data_location=self.data_location)
+        self.write_data('[description:"paint walls"]\n')
+        for i in range(3):
+            cache.partitions(etw, ['modified.after:2015101%dT100000Z' % i])
+            self.write_data('[description:"paint walls"]\n')
+        cache.partitions(etw)
+        self.assertEqual(list(cache.exports), [(self.data_location, ())])
+        self.assertEqual(list(cache.locks), [(self.data_location, ())])
+        other = Mock(export_arena_tasks=self.export,
+                     data_location=os.path.join(self.data_location, 'none'))
+        cache.partitions(other, ['+home'])
+        self.assertEqual(len(cache.exports), 1)
+        self.assertEqual(len(cache.locks), 1)
+
+
 class TestTaskArena(unittest.TestCase):
     def setUp(self):
         self.patcher1 = patch('tasklib.task.TaskWarrior')
         self.MockClass1 = self.patcher1.start()
+        self.runner_patcher = patch('tarenalib.arena.RunnerTaskWarrior',
+                                    new=self.MockClass1)
+        self.runner_patcher.start()
+        task_warrior_pool.clear()
 
     def tearDown(self):
         self.patcher1.stop()
+        self.runner_patcher.stop()
 
     def test_create_arena(self):
         arena = TaskArena()
@@ -137,26 +249,70 @@ class TestTaskArena(unittest.TestCase):
         arena.remote_data = 'remote'
         self.assertEqual(arena.remote_data, 'remote')
 
+    def test_lazy_task_warriors(self):
+        arena1 = TaskArena('arena1', 'local', 'remote1')
+        arena2 = TaskArena('arena2', 'local', 'remote2')
+        self.assertEqual(self.MockClass1.call_count, 0)
+        self.assertEqual(arena1.tw_local.arena, arena1)
+        self.assertEqual(arena2.tw_local.arena, arena2)
+        self.assertIs(arena1.tw_local.tw, arena2.tw_local.tw)
+        self.assertEqual(self.MockClass1.call_count, 1)
+        arena1.tw_remote
+        self.assertEqual(self.MockClass1.call_count, 2)
+        arena1.local_data = 'other'
+        arena1.tw_local
+        self.assertEqual(self.MockClass1.call_count, 3)
+
     def test_json(self):
         arena = TaskArena()
         arena.local_data = 'local'
         arena.remote_data = 'remote'
         arena.name = 'my_arena'
-        data = {'remote_data': 'remote', 'local_data': 'local', 'name': 'my_arena'}
+        data = {'remote_data': 'remote', 'local_data': 'local', 'name': 'my_arena',
+                'last_sync': None, 'sync_cursor': None, 'change_cursor': None}
         self.assertEqual(arena.json, data)
+        data['last_sync'] = '20151010T120000Z'
+        data['sync_cursor'] = {'started': '20151010T110000Z', 'prefix': 'a'}
         arena.json = data
         self.assertEqual(arena.local_data, 'local')
         self.assertEqual(arena.remote_data, 'remote')
         self.assertEqual(arena.name, 'my_arena')
+        self.assertEqual(arena.last_sync, '20151010T120000Z')
+        self.assertEqual(arena.sync_cursor['prefix'], 'a')
+        data['change_cursor'] = {'generation': 'g', 'offset': 3,
+                                 'sequence': 1}
+        arena.json = data
+        self.assertEqual(arena.change_cursor['sequence'], 1)
+        del data['change_cursor']
+        arena.json = data
+        self.assertIsNone(arena.change_cursor)
+        del data['last_sync']
+        del data['sync_cursor']
+        arena.json = data
+        self.assertIsNone(arena.last_sync)
+        self.assertIsNone(arena.sync_cursor)
+
+    def test_get_tasks_by_ids(self):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        arena.tw_local.tasks = lambda pattern, records=False: [pattern]
+        result = arena.get_local_tasks_by_ids(['a', 'b'])
+        self.assertEqual(result, [['Arena:my_arena', '(', 'ArenaTaskID:a',
+                                   'or', 'ArenaTaskID:b', ')']])
+        result = arena.tw_local.tasks_by_arena_task_ids(range(5), chunk_size=2)
+        self.assertEqual(len(result), 3)
 
 
 class TestTaskEmperor(unittest.TestCase):
     def setUp(self):
         self.patcher1 = patch('tasklib.task.TaskWarrior')
         self.MockClass1 = self.patcher1.start()
+        self.runner_patcher = patch('tarenalib.arena.RunnerTaskWarrior',
+                                    new=self.MockClass1)
+        self.runner_patcher.start()
 
     def tearDown(self):
         self.patcher1.stop()
+        self.runner_patcher.stop()
 
     def test_create_task_emperor(self):
         task_emperor = TaskEmperor()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from tarenalib.bench.fake import FakeTaskWarrior
+from tarenalib.bench.generate import generate_arena
+from tarenalib.bench.run import run_benchmark, accept_suggestions
+from tarenalib.index import task_index
+from tarenalib.io import IOManager
+from tarenalib.sync import SyncManager
+
+
+class TestBench(unittest.TestCase):
+
+    def sync(self, arena, batch):
+        sm = SyncManager(arena, IOManager(False), batch=batch)
+        sm.generate_synclist(*sm.export_tasks(full=True))
+        sm.suggest_conflict_resolution()
+        accept_suggestions(sm.synclist)
+        sm.carry_out_sync()
+        return sm.synclist
+
+    def test_generate_arena(self):
+        arena = generate_arena(200, change_rate=0.1, conflict_rate=0.05,
+                               new_rate=0.05, annotations=2)
+        self.assertEqual(len(arena.get_local_tasks()), 205)
+        self.assertEqual(len(arena.get_remote_tasks()), 205)
+        self.assertEqual(len(arena.get_local_tasks()[0].tw_task['annotations']),
+                         2)
+
+    def test_sync_converges(self):
+        for batch in [False, True]:
+            arena = generate_arena(100, change_rate=0.1, conflict_rate=0.05,
+                                   new_rate=0.1)
+            synclist = self.sync(arena, batch)
+            self.assertEqual(len([e for e in synclist if e.error]), 0)
+            self.assertGreater(len(synclist), 10)
+            self.assertEqual(self.sync(arena, batch), [])
+
+    def test_run_benchmark(self):
+        result = run_benchmark(50, batch=True, change_rate=0.2)
+        self.assertEqual(result['tasks'], 50)
+        self.assertEqual(list(result['phases']),
+                         ['export', 'generate_synclist',
+                          'suggest_conflict_resolution', 'carry_out_sync'])
+        # export, export of the tasks to be written and import
+        self.assertEqual(result['commands'], {'local': 3, 'remote': 3})
+
+    def test_bulk_add_remove(self):
+        arena = generate_arena(20, change_rate=0, new_rate=0)
+        tw = arena.tw_local.tw
+        for i in range(5):
+            tw.add_data({'description': 'ops %d' % i, 'project': 'ops',
+                         'entry': '20151010T100000Z', 'uuid': 'ops%d' % i})
+        del tw.commands[:]
+        self.assertEqual(
+            arena.tw_local.add_tasks_matching_pattern(['project:ops']), 5)
+        self.assertEqual(len(tw.commands), 2)
+        self.assertEqual(len(arena.get_local_tasks()), 25)
+        self.assertEqual(
+            arena.tw_local.add_tasks_matching_pattern(['project:ops']), 0)
+        del tw.commands[:]
+        execute_command = tw.execute_command
+
+        def quiet(args, *a, **kw):
+            # modify prints no footer with a non-default verbose setting
+            output = execute_command(args, *a, **kw)
+            return [] if 'modify' in args else output
+        tw.execute_command = quiet
+        self.assertEqual(
+            arena.tw_local.remove_tasks_matching_pattern(['project:ops']), 5)
+        self.assertEqual([c[0] for c in tw.commands], ['count', '('])
+        self.assertEqual(len(arena.get_local_tasks()), 20)
+        del tw.commands[:]
+        self.assertEqual(
+            arena.tw_local.remove_tasks_matching_pattern(['project:ops']), 0)
+        self.assertEqual(len(tw.commands), 1)
+        self.assertEqual(arena.tw_local.remove_tasks_matching_pattern([]), 20)
+        self.assertEqual(arena.get_local_tasks(), [])
+
+    def test_fake_index(self):
+        tw = FakeTaskWarrior()
+        a = tw.add_data({'ArenaTaskID': 'x1', 'description': 'a'})
+        b = tw.add_data({'ArenaTaskID': 'x2', 'description': 'b'})
+        self.assertEqual(tw.matching(['ArenaTaskID:x2']), [b])
+        self.assertEqual(tw.matching([b['uuid'], a['uuid']]), [a, b])
+        self.assertEqual(tw.matching(['(', 'ArenaTaskID:x1', 'or',
+                                      'ArenaTaskID:x2', ')',
+                                      'description:b']), [b])
+        tw.execute_command([a['uuid'], 'modify', 'ArenaTaskID:x3'])
+        self.assertEqual(tw.matching(['ArenaTaskID:x1']), [])
+        self.assertEqual(tw.matching(['ArenaTaskID:x3']), [a])
+        tw.add_data(dict(b, ArenaTaskID=''))
+        self.assertEqual(tw.matching(['ArenaTaskID:x2']), [])
+        self.assertEqual(tw.matching(['2']), [tw.data[b['uuid']]])
+
+    def test_merkle_sync(self):
+        directory = tempfile.mkdtemp()
+        task_index.open(os.path.join(directory, 'index'))
+
+        def touch(side):
+            # FakeTaskWarrior keeps its tasks in memory, so the writes of
+            # TaskWarrior to the data files are simulated
+            with open(os.path.join(directory, side, 'pending.data'),
+                      'a') as f:
+                f.write('.')
+
+        def writing(side, execute_command):
+            def execute(args, *more, **options):
+                result = execute_command(args, *more, **options)
+                if args[0] == 'import':
+                    touch(side)
+                return result
+            return execute
+
+        try:
+            arena = generate_arena(100, change_rate=0.1, conflict_rate=0.05,
+                                   new_rate=0.1)
+            for side, etw in [('local', arena.tw_local),
+                              ('remote', arena.tw_remote)]:
+                os.mkdir(os.path.join(directory, side))
+                touch(side)
+                etw.tw.config['data.location'] = os.path.join(directory, side)
+                etw.tw.execute_command = writing(side,
+                                                 etw.tw.execute_command)
+            sm = SyncManager(arena, IOManager(False), batch=True,
+                             interactive=False)
+            self.assertTrue(sm.sync())
+            self.assertGreater(len(sm.synclist), 10)
+            # the writes of the sync kept the stored hashes up to date
+            self.assertIsNotNone(arena.tw_local.indexed_merkle_tree())
+            self.assertEqual(arena.tw_local.indexed_merkle_tree().root,
+                             arena.tw_remote.indexed_merkle_tree().root)
+            tw = arena.tw_local.tw
+            del tw.commands[:]
+            self.assertTrue(sm.sync())
+            self.assertFalse(sm.synclist)
+            self.assertEqual(tw.commands, [])
+            task = arena.get_local_tasks()[0]
+            task.tw_task['description'] = 'changed'
+            task.save()
+            touch('local')
+            del tw.commands[:]
+            local_tasks, remote_tasks = sm.export_tasks()
+            # the changed side is exported with the watermark and by
+            # ArenaTaskID for counterparts, never in full
+            exports = [c for c in tw.commands if 'export' in c]
+            self.assertTrue(any(arg.startswith('modified.after:')
+                                for arg in exports[0]))
+            self.assertTrue(all(len(c) > 3 for c in exports))
+            self.assertIn(task.ArenaTaskID,
+                          [t.ArenaTaskID for t in local_tasks])
+            self.assertIn(task.ArenaTaskID,
+                          [t.ArenaTaskID for t in remote_tasks])
+        finally:
+            task_index.open(None)
+            shutil.rmtree(directory)
+
+    def test_chunked_sync(self):
+        arena = generate_arena(300, change_rate=0.1, conflict_rate=0.05,
+                               new_rate=0.1)
+        checkpoints = []
+        sm = SyncManager(arena, IOManager(False), batch=True,
+                         interactive=False, chunk_size=50,
+                         checkpoint=lambda: checkpoints.append(
+                             arena.sync_cursor))
+        chunks = sm.prefix_chunks()
+        self.assertEqual(len(chunks), 8)
+        carry_out_sync = sm.carry_out_sync
+        calls = []
+
+        def interrupted():
+            calls.append(True)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            carry_out_sync()
+        sm.carry_out_sync = interrupted
+        self.assertRaises(KeyboardInterrupt, sm.sync)
+        self.assertEqual(arena.sync_cursor['prefix'], chunks[1][-1])
+        sm.carry_out_sync = carry_out_sync
+        del arena.tw_local.tw.commands[:]
+        self.assertTrue(sm.sync())
+        exports = [c for c in arena.tw_local.tw.commands
+                   if 'Arena.any:' in c]
+        self.assertEqual(len(exports), len(chunks) - 2)
+        self.assertIsNone(arena.sync_cursor)
+        self.assertIsNone(checkpoints[-1])
+        self.assertEqual(self.sync(arena, True), [])
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import unittest
+import shutil
+import tempfile
+
+from tarenalib.bench.generate import generate_arena
+from tarenalib.changelog import ChangeLog, change_log_file
+from tarenalib.io import IOManager
+from tarenalib.sync import SyncManager
+
+
+def entries(*arena_task_ids):
+    return [{'ArenaTaskID': i, 'modified': '20151010T100000Z', 'hash': i}
+            for i in arena_task_ids]
+
+
+class TestChangeLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log = ChangeLog(change_log_file(self.directory, 'foo/bar'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_since(self):
+        self.assertEqual(self.log.since(), ([], None))
+        self.assertIsNone(self.log.end())
+        self.log.append(entries('a', 'b'))
+        changes, cursor = self.log.since()
+        self.assertEqual([e['sequence'] for e in changes], [1, 2])
+        self.assertEqual(cursor, self.log.end())
+        self.log.append(entries('a'))
+        with open(self.log.filename, 'a') as f:
+            f.write('{"ArenaTaskID": "c"')
+        changes, cursor = self.log.since(cursor)
+        self.assertEqual([(e['ArenaTaskID'], e['sequence'])
+                          for e in changes], [('a', 3)])
+        self.assertEqual(self.log.since(cursor), ([], cursor))
+        self.log.append(entries('c'))
+        self.assertEqual([e['ArenaTaskID']
+                          for e in self.log.since(cursor)[0]], ['c'])
+
+    def test_compact(self):
+        self.log.append(entries('a', 'b'))
+        _, cursor = self.log.since()
+        self.log.append(entries('a', 'a', 'c'))
+        self.log.compact()
+        self.assertEqual([(e['ArenaTaskID'], e['sequence'])
+                          for e in self.log.since()[0]],
+                         [('b', 2), ('a', 4), ('c', 5)])
+        self.assertEqual([e['ArenaTaskID'] for e in self.log.since(cursor)[0]],
+                         ['a', 'c'])
+        self.log.min_compaction = 2
+        self.log.append(entries('c', 'c', 'c'))
+        self.assertEqual(len(self.log.since()[0]), 6)
+        self.log.append(entries('c'))
+        self.assertEqual(len(self.log.since()[0]), 3)
+
+    def test_sync(self):
+        arena = generate_arena(50, change_rate=0, conflict_rate=0,
+                               new_rate=0)
+        other = generate_arena(50, change_rate=0, conflict_rate=0,
+                               new_rate=0)
+        remote = arena.tw_remote.tw
+        other.tw_remote = arena.tw_remote
+        remote.change_log = lambda arena_name: self.log
+        self.log.append(entries('x'))
+        for a in [arena, other]:
+            a.last_sync = '20151010T000000Z'
+            a.change_cursor = self.log.end()
+        self.assertTrue(SyncManager(arena, IOManager(False),
+                                    interactive=False).sync(True))
+        self.assertIsNotNone(arena.change_cursor)
+        task = other.get_local_tasks()[0]
+        task.tw_task['description'] = 'changed by other'
+        task.save()
+        sm = SyncManager(other, IOManager(False), interactive=False)
+        self.assertTrue(sm.sync(True))
+        self.assertEqual(other.change_cursor, self.log.end())
+        self.assertEqual(len(self.log.since(arena.change_cursor)[0]), 1)
+        remote.commands = []
+        sm = SyncManager(arena, IOManager(False), interactive=False)
+        self.assertTrue(sm.sync())
+        self.assertEqual([e.action for e in sm.synclist], ['DOWNLOAD'])
+        self.assertFalse([c for c in remote.commands if 'Arena.any:' in c])
+        self.assertIn('changed by other', [
+            t['description'] for t in arena.get_local_tasks(records=True)])
+
+    def test_sync_without_log(self):
+        arena = generate_arena(50, change_rate=0, conflict_rate=0,
+                               new_rate=0)
+        remote = arena.tw_remote.tw
+        remote.change_log = lambda arena_name: self.log
+        arena.last_sync = '20151010T000000Z'
+        self.assertTrue(SyncManager(arena, IOManager(False),
+                                    interactive=False).sync())
+        self.assertIsNone(arena.change_cursor)
+        # a change to the remote side without tarena is not logged
+        data = next(iter(remote.data.values()))
+        remote.modify(data['uuid'], {'description': 'changed remotely'})
+        sm = SyncManager(arena, IOManager(False), interactive=False)
+        self.assertTrue(sm.sync())
+        self.assertEqual([e.action for e in sm.synclist], ['DOWNLOAD'])
+        self.assertIsNone(arena.change_cursor)
+        self.assertFalse(self.log.exists())
@@ -40,12 +40,14 @@ class TestTArena(unittest.TestCase):
 
     def test_install(self):
         with self.runner.isolated_filesystem():
-            result = self.runner.invoke(cli, ['install'])
+            result = self.runner.invoke(cli, cmd + ['install', '--hooks',
+                                                    'hooks'])
         assert 'successful' in result.output
 
     def test_uninstall(self):
         with self.runner.isolated_filesystem():
-            result = self.runner.invoke(cli, ['uninstall'])
+            result = self.runner.invoke(cli, cmd + ['uninstall', '--hooks',
+                                                    'hooks'])
         assert 'successful' in result.output
 
     def test_create(self):
@@ -150,3 +152,37 @@ class TestTArena(unittest.TestCase):
             self.runner.invoke(cli, cmd + ['add', 'foo', description])
             result = self.runner.invoke(cli, cmd + ['sync', 'foo'], input='a\n')
             assert len(tw_remote.tasks.filter()) == 1
+
+    def test_sync_all(self):
+        with self.runner.isolated_filesystem():
+            dloc = os.path.join(os.getcwd(), 'local')
+            dremote = os.path.join(os.getcwd(), 'remote')
+            tw_local = TaskWarrior(dloc)
+            tw_remote = TaskWarrior(dremote)
+            t = Task(tw_local)
+            description = 'do dishes'
+            t['description'] = description
+            t.save()
+            self.runner.invoke(cli, cmd_dummy_arena)
+            self.runner.invoke(cli, cmd + ['add', 'foo', description])
+            result = self.runner.invoke(cli, cmd + ['sync', '--all'])
+            assert result.exit_code == 0
+            assert len(tw_remote.tasks.filter()) == 1
+
+    def test_sync_arguments(self):
+        with self.runner.isolated_filesystem():
+            result = self.runner.invoke(cli, cmd + ['sync'])
+            assert result.exit_code == 2
+            assert 'either ARENA or --all' in result.output
+            result = self.runner.invoke(cli, cmd + ['sync', 'foo', '--all'])
+            assert result.exit_code == 2
+            assert 'either ARENA or --all' in result.output
+
+    def test_profile(self):
+        with self.runner.isolated_filesystem():
+            result = self.runner.invoke(cli, cmd + ['--profile', 'profile.json',
+                                                    '--cprofile', 'profile.prof',
+                                                    'arenas'])
+            assert result.exit_code == 0
+            assert os.path.isfile('profile.json')
+            assert os.path.isfile('profile.prof')
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import unittest
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from tarenalib.bench.generate import generate_arena
+from tarenalib.hooks import DirtyQueue, hook_names, install_hooks, \
+    uninstall_hooks
+from tarenalib.io import IOManager
+from tarenalib.sync import SyncManager
+
+
+class TestHooks(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.hooks = os.path.join(self.directory, 'hooks')
+        self.queues = os.path.join(self.directory, 'dirty')
+        install_hooks(self.hooks, self.queues)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_hook(self, name, *tasks):
+        lines = ''.join(json.dumps(task) + '\n' for task in tasks)
+        output = subprocess.check_output(
+            [os.path.join(self.hooks, name)], input=lines.encode('utf-8'))
+        self.assertEqual(output.decode('utf-8'), json.dumps(tasks[-1]) + '\n')
+
+    def test_hooks(self):
+        task = {'uuid': 'a1', 'description': 'paint walls'}
+        arena_task = dict(task, Arena='foo/bar', ArenaTaskID='x1')
+        self.run_hook('on-add.tarena', task)
+        self.run_hook('on-add.tarena', arena_task)
+        self.run_hook('on-modify.tarena', task, arena_task)
+        self.run_hook('on-modify.tarena', arena_task, task)
+        queue = DirtyQueue(self.queues, 'foo/bar')
+        self.assertEqual(queue.claim(), ['x1'])
+        uninstall_hooks(self.hooks, self.queues)
+        self.assertFalse(any(os.path.exists(os.path.join(self.hooks, name))
+                             for name in hook_names))
+        self.assertFalse(queue.complete_since('20991231T000000Z'))
+
+    def test_queue(self):
+        queue = DirtyQueue(self.queues, 'foo')
+        self.assertFalse(queue.complete_since(None))
+        self.assertTrue(queue.complete_since('20991231T000000Z'))
+        self.assertFalse(queue.complete_since('20000101T000000Z'))
+        self.assertEqual(queue.claim(), [])
+        with open(queue.filename, 'a') as f:
+            f.write('x1\nx2\nx1\n')
+        self.assertEqual(queue.claim(), ['x1', 'x2'])
+        queue.release(False)
+        self.assertEqual(DirtyQueue(self.queues, 'foo').claim(),
+                         ['x1', 'x2'])
+        queue = DirtyQueue(self.queues, 'foo')
+        self.assertEqual(queue.claim(), ['x1', 'x2'])
+        claimed = list(queue.claimed)[0]
+        with open(claimed, 'a') as f:
+            f.write('x3\n')
+        queue.release(True)
+        self.assertEqual(queue.claim(), ['x3'])
+        queue.release(True)
+        self.assertEqual(queue.claim(), [])
+
+    def test_sync(self):
+        arena = generate_arena(50, change_rate=0, conflict_rate=0,
+                               new_rate=0)
+        arena.last_sync = '20991231T000000Z'
+        queue = DirtyQueue(self.queues, arena.name)
+        task = arena.get_local_tasks()[0]
+        task.tw_task['description'] = 'changed'
+        task.save()
+        with open(queue.filename, 'a') as f:
+            f.write(task.ArenaTaskID + '\n')
+        local = arena.tw_local.tw
+        local.commands = []
+        sm = SyncManager(arena, IOManager(False), interactive=False,
+                         dirty_queue=queue)
+        self.assertTrue(sm.sync())
+        self.assertEqual([e.action for e in sm.synclist], ['UPLOAD'])
+        self.assertFalse([c for c in local.commands if 'Arena.any:' in c])
+        self.assertEqual(queue.claim(), [])
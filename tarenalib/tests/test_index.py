@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from tarenalib.index import TaskIndex, task_index, data_signature
+from tarenalib.arena import TaskArena, EnhancedTaskWarrior
+from tarenalib.bench.fake import FakeTaskWarrior
+
+
+class TestTaskIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_location = os.path.join(self.directory, 'data')
+        os.mkdir(self.data_location)
+        self.touch('first')
+        self.index = TaskIndex(os.path.join(self.directory, 'index'))
+
+    def tearDown(self):
+        self.index.open(None)
+        task_index.open(None)
+        shutil.rmtree(self.directory)
+
+    def touch(self, content):
+        with open(os.path.join(self.data_location, 'pending.data'), 'a') as f:
+            f.write(content)
+
+    def test_disabled(self):
+        index = TaskIndex()
+        self.assertFalse(index.enabled)
+        index.record(self.data_location, [('x1', 'a1', None)], rebuild=True)
+        self.assertEqual(index.lookup(self.data_location, ['x1']), {})
+
+    def test_record_lookup(self):
+        self.index.record(self.data_location, [('x1', 'a1', None)])
+        self.assertFalse(self.index.is_fresh(self.data_location))
+        self.assertEqual(self.index.lookup(self.data_location, ['x1']), {})
+        self.index.record(self.data_location, [('x2', 'a2', None)],
+                          rebuild=True)
+        self.assertTrue(self.index.is_fresh(self.data_location))
+        self.assertEqual(self.index.lookup(self.data_location, ['x1', 'x2']),
+                         {'x2': 'a2'})
+        self.touch('second')
+        self.index.record(self.data_location, [('x3', 'a3', None)],
+                          fresh=True)
+        self.assertEqual(self.index.lookup(self.data_location, ['x2', 'x3']),
+                         {'x2': 'a2', 'x3': 'a3'})
+        self.touch('third')
+        self.assertFalse(self.index.is_fresh(self.data_location))
+        self.assertEqual(self.index.lookup(self.data_location, ['x2']), {})
+
+    def test_persistent(self):
+        self.index.record(self.data_location, [('x1', 'a1', None)],
+                          rebuild=True)
+        index = TaskIndex(os.path.join(self.directory, 'index'))
+        self.assertEqual(index.lookup(self.data_location, ['x1']),
+                         {'x1': 'a1'})
+        index.open(None)
+
+    def test_arena_lookup(self):
+        task_index.open(os.path.join(self.directory, 'index'))
+        arena = TaskArena('foo', self.data_location, 'remote')
+        arena.tw_local = EnhancedTaskWarrior(
+            FakeTaskWarrior(self.data_location), arena)
+        tw = arena.tw_local.tw
+        tw.add_data({'Arena': 'foo', 'ArenaTaskID': 'x1',
+                     'description': 'paint walls'})
+        self.assertEqual(len(arena.get_local_tasks()), 1)
+        task = arena.tw_local.add_task(arena.get_local_tasks()[0])
+        task.ArenaTaskID = 'x2'
+        task.save()
+        self.assertEqual(len(task_index.lookup(self.data_location,
+                                               ['x1', 'x2'])), 2)
+        tasks = arena.get_local_tasks_by_ids(['x1', 'x2', 'x3'])
+        self.assertEqual(sorted(t.ArenaTaskID for t in tasks), ['x1', 'x2'])
+        self.assertIn(task.tw_task['uuid'], tw.commands[-2])
+        self.assertEqual(tw.commands[-1][-3:], ['(', 'ArenaTaskID:x3', ')'])
+
+    def test_content_hashes(self):
+        self.assertIsNone(self.index.content_hashes(self.data_location, 'foo'))
+        self.index.record_hashes(self.data_location, {'foo': {'x1': 'h1'}},
+                                 (None, None, None))
+        self.assertIsNone(self.index.content_hashes(self.data_location, 'foo'))
+        self.index.record_hashes(self.data_location, {'foo': {'x1': 'h1'}},
+                                 data_signature(self.data_location))
+        self.assertEqual(self.index.content_hashes(self.data_location, 'foo'),
+                         {'x1': 'h1'})
+        self.assertEqual(self.index.content_hashes(self.data_location, 'bar'),
+                         {})
+        self.touch('second')
+        self.assertIsNone(self.index.content_hashes(self.data_location, 'foo'))
+
+    def test_update_hashes(self):
+        self.index.record_hashes(self.data_location,
+                                 {'foo': {'x1': 'h1', 'x2': 'h2'}},
+                                 data_signature(self.data_location))
+        self.assertTrue(self.index.hashes_are_fresh(self.data_location))
+        self.touch('second')
+        self.index.update_hashes(self.data_location,
+                                 {'foo': {'x1': 'h3'}, 'bar': {'x2': 'h2'}},
+                                 True)
+        self.assertEqual(self.index.content_hashes(self.data_location, 'foo'),
+                         {'x1': 'h3'})
+        self.assertEqual(self.index.content_hashes(self.data_location, 'bar'),
+                         {'x2': 'h2'})
+        self.touch('third')
+        self.assertFalse(self.index.hashes_are_fresh(self.data_location))
+        self.index.update_hashes(self.data_location, {'foo': {'x1': 'h4'}},
+                                 False)
+        self.assertFalse(self.index.hashes_are_fresh(self.data_location))
+
+    def test_merkle_tree(self):
+        task_index.open(os.path.join(self.directory, 'index'))
+        arena = TaskArena('foo', self.data_location, 'remote')
+        arena.tw_local = EnhancedTaskWarrior(
+            FakeTaskWarrior(self.data_location), arena)
+        tw = arena.tw_local.tw
+        tw.add_data({'Arena': 'foo', 'ArenaTaskID': 'x1',
+                     'description': 'paint walls'})
+        tree = arena.tw_local.merkle_tree()
+        self.assertEqual(len(tw.commands), 1)
+        self.assertEqual(arena.tw_local.merkle_tree().root, tree.root)
+        self.assertEqual(len(tw.commands), 1)
+        tasks = arena.get_local_tasks_in_buckets(['x1'], records=True)
+        self.assertEqual([t.ArenaTaskID for t in tasks], ['x1'])
+        shared_tasks = arena.tw_local.shared_tasks(tasks)
+        self.assertEqual(shared_tasks[tasks[0].uuid].tw_task['description'],
+                         'paint walls')
+        self.assertEqual(len(tw.commands), 1)
@@ -93,4 +93,19 @@ class TestIOManager(unittest.TestCase):
             self.assertEqual(arena.local_data, te.arenas[0].local_data)
             self.assertEqual(arena.remote_data, te.arenas[0].remote_data)
 
-
+    def test_save_task_emperor_atomically(self):
+        runner = CliRunner()
+        sys.stdout = self.old_stdout
+        with runner.isolated_filesystem():
+            config_file_name = os.path.join(os.getcwd(), 'config_file')
+            iom = IOManager(False, 75, config_file_name)
+            te = iom.get_task_emperor()
+            te.create_arena('foo', 'local', 'remote')
+            iom.save_task_emperor(te)
+            te.create_arena('bar', 'local', 'remote2')
+            with patch.object(te, 'save', side_effect=KeyboardInterrupt):
+                self.assertRaises(KeyboardInterrupt, iom.save_task_emperor,
+                                  te)
+            self.assertEqual(os.listdir(os.getcwd()), ['config_file'])
+            te = IOManager(False, 75, config_file_name).get_task_emperor()
+            self.assertEqual([a.name for a in te.arenas], ['foo'])
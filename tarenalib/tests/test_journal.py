@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+from unittest.mock import patch
+import os
+import shutil
+import tempfile
+
+from tarenalib.bench.generate import generate_arena
+from tarenalib.arena import EnhancedTaskWarrior
+from tarenalib.io import IOManager
+from tarenalib.journal import SyncJournal
+from tarenalib.sync import SyncManager
+
+
+class TestSyncJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'journal', 'foo.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_journal(self):
+        journal = SyncJournal(self.filename)
+        self.assertIsNone(journal.pending())
+        journal.begin({'arena': 'foo'},
+                      [{'side': 'local', 'data': {'uuid': 'a%d' % i}}
+                       for i in range(3)])
+        journal.commit([1])
+        journal.commit([])
+        header, entries = SyncJournal(self.filename).pending()
+        self.assertEqual(header, {'arena': 'foo'})
+        self.assertEqual([e['data']['uuid'] for e in entries], ['a0', 'a2'])
+        with open(self.filename, 'a') as f:
+            f.write('{"committed": [0')
+        self.assertEqual(len(journal.pending()[1]), 2)
+        journal.finish()
+        self.assertFalse(journal.exists())
+        self.assertIsNone(journal.pending())
+
+    def test_resume(self):
+        arena = generate_arena(50, change_rate=0.2, conflict_rate=0.05,
+                               new_rate=0.1)
+        num_tasks = len(arena.tw_local.tw.data)
+        sm = SyncManager(arena, IOManager(False), interactive=False,
+                         journal=SyncJournal(self.filename))
+        import_tasks = EnhancedTaskWarrior.import_tasks
+        calls = []
+
+        def interrupted(etw, tasks):
+            calls.append(True)
+            if len(calls) == 4:
+                shutil.copy(self.filename, self.filename + '.copy')
+                raise KeyboardInterrupt
+            import_tasks(etw, tasks)
+        with patch.object(EnhancedTaskWarrior, 'import_tasks', autospec=True,
+                          side_effect=interrupted):
+            self.assertRaises(KeyboardInterrupt, sm.sync, True)
+        self.assertIsNone(arena.last_sync)
+        header, entries = sm.journal.pending()
+        self.assertGreater(len(entries), 3)
+        sm = SyncManager(arena, IOManager(False), interactive=False,
+                         journal=SyncJournal(self.filename))
+        self.assertTrue(sm.replay_journal())
+        self.assertEqual(arena.last_sync, header['started'])
+        self.assertIsNone(sm.replay_journal())
+        shutil.move(self.filename + '.copy', self.filename)
+        self.assertTrue(sm.replay_journal())
+        self.assertGreater(len(arena.tw_local.tw.data), num_tasks)
+        num_tasks = len(arena.tw_local.tw.data)
+        self.assertTrue(sm.sync(True))
+        self.assertIsNone(sm.synclist)
+        self.assertEqual(len(arena.tw_local.tw.data), num_tasks)
+
+    def test_replay_keeps_later_changes(self):
+        arena = generate_arena(50, change_rate=0.2, conflict_rate=0.05,
+                               new_rate=0.1)
+        sm = SyncManager(arena, IOManager(False), interactive=False,
+                         journal=SyncJournal(self.filename))
+        with patch.object(EnhancedTaskWarrior, 'import_tasks',
+                          side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, sm.sync, True)
+        header, entries = sm.journal.pending()
+        tw = arena.tw_local.tw
+        tasks = {data['ArenaTaskID']: data for data in tw.data.values()}
+        edited = next(e for e in entries if e['side'] == 'local' and
+                      e['ArenaTaskID'] in tasks)
+        tw.modify(tasks[edited['ArenaTaskID']]['uuid'],
+                  {'description': 'edited after the crash'})
+        sm = SyncManager(arena, IOManager(False), interactive=False,
+                         journal=SyncJournal(self.filename))
+        imported = []
+        import_data = EnhancedTaskWarrior.import_data
+
+        def recorded(etw, data_list):
+            imported.extend(data['ArenaTaskID'] for data in data_list)
+            import_data(etw, data_list)
+        with patch.object(EnhancedTaskWarrior, 'import_data', autospec=True,
+                          side_effect=recorded):
+            self.assertTrue(sm.replay_journal())
+        self.assertEqual(len(imported), len(entries) - 1)
+        self.assertNotIn(edited['ArenaTaskID'], imported)
+        self.assertEqual(tasks[edited['ArenaTaskID']]['description'],
+                         'edited after the crash')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from tarenalib.merkle import MerkleTree
+from tarenalib.arena import content_hash
+
+
+class TestMerkleTree(unittest.TestCase):
+
+    def test_diff(self):
+        hashes = {'ab1': 'h1', 'ab2': 'h2', 'cd1': 'h3', '7': 'h4'}
+        tree = MerkleTree(hashes)
+        self.assertEqual(MerkleTree(dict(hashes)).root, tree.root)
+        self.assertEqual(tree.diff(MerkleTree(dict(hashes))), [])
+        other = MerkleTree(dict(hashes, ab2='h5', ef1='h6'))
+        self.assertNotEqual(other.root, tree.root)
+        self.assertEqual(tree.diff(other), ['ab', 'ef'])
+        self.assertEqual(other.diff(MerkleTree({})),
+                         ['7', 'ab', 'cd', 'ef'])
+        self.assertEqual(MerkleTree({}).root, '')
+
+    def test_content_hash(self):
+        data = {'description': 'paint walls', 'tags': ['home'],
+                'modified': '20151010T100000Z', 'imask': 1}
+        self.assertEqual(content_hash(data), content_hash(
+            {'description': 'paint walls', 'tags': 'home', 'imask': 1.0,
+             'project': ''}))
+        self.assertNotEqual(content_hash(data), content_hash(
+            dict(data, description='clean floor')))
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+from unittest.mock import patch
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+from tarenalib.arena import TaskRecord
+from tarenalib.bench.generate import generate_arena
+from tarenalib.io import IOManager
+from tarenalib.policy import Policy, InvalidPolicy, DecisionLog, \
+    BulkCommand, InvalidCommand
+from tarenalib.sync import SyncElement, SyncManager, SyncIOManager
+
+
+def element(local, remote, suggestion='CONFLICT'):
+    ltask = TaskRecord(dict(local, ArenaTaskID='x1')) if local else None
+    rtask = TaskRecord(dict(remote, ArenaTaskID='x1')) if remote else None
+    fields = ltask.different_fields(rtask) if ltask and rtask else None
+    return SyncElement(ltask, rtask, fields, suggestion)
+
+
+class TestPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.older = {'description': 'paint walls', 'project': 'home.garden',
+                      'modified': '20151010T100000Z'}
+        self.newer = {'description': 'paint walls', 'project': 'home.garden',
+                      'tags': ['urgent'], 'modified': '20151010T110000Z'}
+
+    def test_invalid(self):
+        for rule in ['first', 'project:home=mine', 'field:=local', 'foo:x']:
+            self.assertRaises(InvalidPolicy, Policy, [rule])
+
+    def test_resolve(self):
+        synclist = [element(self.older, self.newer),
+                    element(self.newer, self.older),
+                    element(self.older, None, 'UPLOAD'),
+                    element(dict(self.older, project='work'), self.newer)]
+        policy = Policy()
+        policy.resolve(synclist)
+        self.assertEqual([e.action for e in synclist],
+                         ['DOWNLOAD', 'UPLOAD', 'UPLOAD', 'DOWNLOAD'])
+        policy = Policy(['local', 'field:tags=remote', 'project:home=skip'])
+        decisions = policy.resolve(synclist, 'foo')
+        self.assertEqual([e.action for e in synclist],
+                         ['SKIP', 'SKIP', 'SKIP', 'DOWNLOAD'])
+        self.assertEqual([d['rule'] for d in decisions],
+                         ['project:home', 'project:home', 'project:home',
+                          'field:tags'])
+        self.assertEqual(decisions[3]['fields'], ['project', 'tags'])
+        self.assertEqual(decisions[3]['arena'], 'foo')
+        Policy(['remote', 'field:project=local']).resolve(synclist)
+        self.assertEqual([e.action for e in synclist],
+                         ['DOWNLOAD', 'DOWNLOAD', 'UPLOAD', 'UPLOAD'])
+
+    def test_missing_modified(self):
+        unmodified = dict(self.older)
+        del unmodified['modified']
+        synclist = [element(unmodified, self.newer),
+                    element(self.older, unmodified),
+                    element(unmodified, dict(unmodified, tags=['urgent']))]
+        Policy().resolve(synclist)
+        self.assertEqual([e.action for e in synclist],
+                         ['DOWNLOAD', 'UPLOAD', 'UPLOAD'])
+        now = datetime.datetime(2015, 11, 10, tzinfo=datetime.timezone.utc)
+        self.assertEqual(BulkCommand.last_modified(synclist[0]),
+                         synclist[0].remote_task.last_modified())
+        self.assertIsNone(BulkCommand.last_modified(synclist[2]))
+        for e in synclist:
+            e.action = ''
+        command = BulkCommand('skip all where older than 30 days', now)
+        self.assertEqual(command.apply(synclist), 3)
+        command = BulkCommand('upload all where newer than 30 days', now)
+        self.assertEqual(command.apply(synclist), 0)
+
+    def test_decision_log(self):
+        directory = tempfile.mkdtemp()
+        try:
+            log = DecisionLog(os.path.join(directory, 'decisions'))
+            log.write([{'action': 'UPLOAD'}])
+            log.write([{'action': 'SKIP'}, {'action': 'DOWNLOAD'}])
+            with open(log.filename) as f:
+                self.assertEqual([json.loads(line)['action'] for line in f],
+                                 ['UPLOAD', 'SKIP', 'DOWNLOAD'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_sync(self):
+        arena = generate_arena(50, change_rate=0, conflict_rate=0.2,
+                               new_rate=0)
+        sm = SyncManager(arena, IOManager(False), policy=Policy(['local']))
+        self.assertTrue(sm.sync(True))
+        self.assertTrue(all(e.action == 'UPLOAD' for e in sm.synclist))
+        descriptions = sorted(t.tw_task['description']
+                              for t in arena.get_remote_tasks())
+        self.assertTrue(all('side 0' in d for d in descriptions
+                            if 'changed' in d))
+
+
+class TestBulkCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.now = datetime.datetime(2015, 11, 10,
+                                     tzinfo=datetime.timezone.utc)
+        old = {'description': 'paint walls', 'project': 'ops.db',
+               'modified': '20151001T100000Z'}
+        self.synclist = [
+            element(old, dict(old, tags=['urgent'])),
+            element(dict(old, project='home'),
+                    dict(old, project='home', description='paint wall',
+                         modified='20151109T100000Z')),
+            element(None, dict(old, project='home',
+                               modified='20151109T100000Z'), 'DOWNLOAD')]
+
+    def actions(self):
+        return [e.action for e in self.synclist]
+
+    def test_invalid(self):
+        for text in ['upload', 'push all', 'skip all where tags',
+                     'skip all where older than many days']:
+            self.assertRaises(InvalidCommand, BulkCommand, text)
+
+    def test_apply(self):
+        command = BulkCommand('upload all where project:ops', self.now)
+        self.assertEqual(command.apply(self.synclist), 1)
+        self.assertEqual(self.actions(), ['UPLOAD', '', ''])
+        command = BulkCommand('skip all where only tags differ', self.now)
+        self.assertEqual(command.apply(self.synclist), 0)
+        command = BulkCommand('u all where newer than 30 days', self.now)
+        self.assertEqual(command.apply(self.synclist), 1)
+        self.assertEqual(self.actions(), ['UPLOAD', 'UPLOAD', ''])
+        command = BulkCommand('download everything older than 5 days',
+                              self.now)
+        self.assertEqual(command.apply(self.synclist), 0)
+        command = BulkCommand('skip all where project:home and '
+                              'description differs', self.now)
+        self.assertEqual(command.apply(self.synclist), 0)
+        self.assertEqual(BulkCommand('d all').apply(self.synclist), 1)
+        self.assertEqual(self.actions(), ['UPLOAD', 'UPLOAD', 'DOWNLOAD'])
+
+    @patch('builtins.input', side_effect=[
+        'm', 'skip all where only tags differ', 'push all',
+        'download all where project:home', 'u'])
+    def test_manual_sync(self, mock_input):
+        siom = SyncIOManager(IOManager(False))
+        result = siom.user_checks_synclist(self.synclist, 'foo')
+        self.assertEqual(self.actions(), ['SKIP', 'DOWNLOAD', 'DOWNLOAD'])
+        self.assertEqual(mock_input.call_count, 4)
+        self.assertEqual(result, self.synclist)
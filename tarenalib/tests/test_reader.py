@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+from unittest.mock import Mock
+import json
+import os
+import shutil
+import tempfile
+import tasklib.task as tlib
+
+from tarenalib.reader import DataFileReader, UnsupportedFormat
+from tarenalib.arena import EnhancedTaskWarrior, TaskArena
+
+pending_data = (
+    '[description:"paint walls" entry:"1444471200" modified:"1444474800" '
+    'status:"pending" uuid:"a1"]\n'
+    '[Arena:"foo" ArenaTaskID:"x1" description:"do \\"dishes\\"" '
+    'entry:"1444471200" modified:"1444474800" status:"pending" '
+    'tags:"home,kitchen" uuid:"a2"]\n'
+    '[Arena:"bar" ArenaTaskID:"x2" annotation_1444474800:"bought soap" '
+    'description:"clean floor" entry:"1444471200" modified:"1444564800" '
+    'status:"pending" uuid:"a3"]\n'
+)
+
+working_set_data = (
+    '[description:"a" entry:"1444471200" status:"pending" uuid:"b1"]\n'
+    '[Arena:"foo" ArenaTaskID:"y1" description:"b" end:"1444474800" '
+    'entry:"1444471200" status:"completed" uuid:"b2"]\n'
+    '[description:"c" end:"1444474800" entry:"1444471200" '
+    'status:"deleted" uuid:"b3"]\n'
+    '[Arena:"foo" ArenaTaskID:"y2" description:"d" entry:"1444471200" '
+    'status:"waiting" uuid:"b4" wait:"1893456000"]\n'
+    '[Arena:"foo" ArenaTaskID:"y3" description:"e" entry:"1444471200" '
+    'status:"pending" uuid:"b5"]\n'
+)
+
+completed_data = (
+    '[Arena:"foo" ArenaTaskID:"x3" description:"cut lawn" '
+    'end:"1444474800" entry:"1444471200" modified:"1444474800" '
+    'status:"completed" uuid:"a4"]\n'
+)
+
+
+class TestDataFileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.data_location = tempfile.mkdtemp()
+        self.write('pending.data', pending_data)
+        self.write('completed.data', completed_data)
+        self.reader = DataFileReader(self.data_location)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_location)
+
+    def write(self, data_file, content):
+        with open(os.path.join(self.data_location, data_file), 'w') as f:
+            f.write(content)
+
+    def test_arena_tasks(self):
+        tasks = self.reader.arena_tasks()
+        self.assertEqual([t['uuid'] for t in tasks], ['a2', 'a3', 'a4'])
+        self.assertEqual(tasks[0]['description'], 'do "dishes"')
+        self.assertEqual(tasks[0]['tags'], ['home', 'kitchen'])
+        self.assertEqual(tasks[0]['entry'], '20151010T100000Z')
+        self.assertEqual(tasks[0]['id'], 2)
+        self.assertEqual(tasks[1]['annotations'],
+                         [{'entry': '20151010T110000Z',
+                           'description': 'bought soap'}])
+        self.assertEqual(tasks[2]['id'], 0)
+
+    def test_modified_after(self):
+        tasks = self.reader.arena_tasks(['modified.after:20151010T110000Z'])
+        self.assertEqual([t['uuid'] for t in tasks], ['a3'])
+
+    def test_unsupported(self):
+        self.assertRaises(UnsupportedFormat, self.reader.arena_tasks,
+                          ['+home'])
+        self.write('pending.data', '{"uuid": "a1", "Arena": "foo"}\n')
+        self.assertRaises(UnsupportedFormat, self.reader.arena_tasks)
+        os.remove(os.path.join(self.data_location, 'pending.data'))
+        self.assertRaises(UnsupportedFormat, self.reader.arena_tasks)
+
+    def test_fallback(self):
+        etw = EnhancedTaskWarrior(Mock(), TaskArena('foo'))
+        etw.tw.config = {'data.location': self.data_location}
+        etw.export = Mock(return_value=[])
+        etw.native_reader = True
+        self.assertEqual(len(etw.export_arena_tasks()), 3)
+        self.assertFalse(etw.export.called)
+        etw.export_arena_tasks(['+home'])
+        etw.export.assert_called_with(['Arena.any:', '+home'])
+
+    def test_working_set_ids(self):
+        self.write('pending.data', working_set_data)
+        self.write('completed.data', '')
+        self.assertEqual({t['uuid']: t['id']
+                          for t in self.reader.arena_tasks()},
+                         {'b2': 0, 'b4': 2, 'b5': 3})
+
+    @unittest.skipUnless(shutil.which('task'), 'task is not installed')
+    def test_export_parity(self):
+        self.write('pending.data', working_set_data)
+        native = {t['uuid']: t['id'] for t in self.reader.arena_tasks()}
+        tw = tlib.TaskWarrior(data_location=self.data_location)
+        exported = [json.loads(line) for line in
+                    tw.execute_command(['Arena.any:', 'export']) if line]
+        self.assertEqual(native, {t['uuid']: t['id'] for t in exported})
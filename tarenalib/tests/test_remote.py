@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import unittest
+from unittest.mock import Mock
+import http.client
+import shutil
+import tempfile
+import threading
+import tasklib.task as tlib
+
+from tarenalib.arena import task_warrior_pool
+from tarenalib.bench.generate import generate_arena
+from tarenalib.io import IOManager
+from tarenalib.remote import RemoteTaskWarrior, ConnectionPool, \
+    connection_pool, parse_url
+from tarenalib.server import SyncServer, InvalidRequest, check_command, \
+    parse_locations
+from tarenalib.sync import SyncManager
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def lost_response(self):
+        connection = Mock()
+        connection.getresponse.side_effect = \
+            http.client.RemoteDisconnected('closed')
+        return connection
+
+    def test_retry(self):
+        pool = ConnectionPool()
+        pool.is_dropped = lambda connection: False
+        connections = [self.lost_response() for i in range(3)]
+        for connection in connections:
+            pool.put('host', 1, connection)
+        # the response of a write was lost, so it is not sent again
+        self.assertRaises(http.client.RemoteDisconnected, pool.request,
+                          'host', 1, 'POST', '/foo', {})
+        self.assertEqual(len(connections[2].request.mock_calls), 1)
+        self.assertEqual(len(connections[1].request.mock_calls), 0)
+        # reads are sent again at most retries times
+        self.assertRaises(http.client.RemoteDisconnected, pool.request,
+                          'host', 1, 'GET', '/foo', idempotent=True)
+        self.assertEqual(len(connections[1].request.mock_calls), 1)
+        self.assertEqual(len(connections[0].request.mock_calls), 1)
+
+    def test_read_only(self):
+        self.assertTrue(RemoteTaskWarrior.is_read_only('GET', None))
+        self.assertTrue(RemoteTaskWarrior.is_read_only('POST', {'commands': [
+            {'args': ['export', '--', 'Arena:foo']},
+            {'log': 'since', 'cursor': None}]}))
+        self.assertFalse(RemoteTaskWarrior.is_read_only('POST', {'commands': [
+            {'args': ['export']}, {'args': ['import'], 'input': ''}]}))
+        self.assertFalse(RemoteTaskWarrior.is_read_only('POST', {'commands': [
+            {'log': 'append', 'entries': []}]}))
+
+
+class TestSyncServer(unittest.TestCase):
+
+    def setUp(self):
+        self.arena = generate_arena(50, change_rate=0.2, conflict_rate=0,
+                                    new_rate=0.1)
+        self.fake = self.arena.tw_remote.tw
+        self.directory = tempfile.mkdtemp()
+        self.server = SyncServer(('127.0.0.1', 0),
+                                 {'bench': self.directory})
+        self.server.warrior = lambda name: self.fake
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'tarena://127.0.0.1:%d/bench' % \
+            self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        connection_pool.clear()
+        task_warrior_pool.clear()
+        shutil.rmtree(self.directory)
+
+    def test_parse(self):
+        self.assertEqual(parse_url('tarena://example.org/foo'),
+                         ('example.org', 8765, 'foo'))
+        self.assertRaises(ValueError, parse_url, '/home/foo/.task')
+        self.assertRaises(ValueError, parse_url, 'tarena://example.org')
+        self.assertEqual(parse_locations(['foo=/srv/foo']),
+                         {'foo': '/srv/foo'})
+        self.assertRaises(InvalidRequest, parse_locations, ['/srv/foo'])
+
+    def test_check_command(self):
+        check_command(['export', '--', 'Arena.any:', '(', '+a', 'or', '+b',
+                       ')'])
+        check_command(['(', '+home', ')', 'Arena:foo', 'modify', 'Arena:'])
+        check_command(['12', 'export'])
+        check_command(['modify', "description:'src.py'", 'project:arc:x'])
+        for args in [['rc.data.location:/tmp', 'export'],
+                     ['execute', 'true'],
+                     ['config', 'hooks', 'on'],
+                     ['import', '/etc/passwd'],
+                     ['export', 'rc.hooks=on'],
+                     ['export', '--', 'rc.hooks:on'],
+                     ['annotate', 'rc.data.location:/tmp'],
+                     ['modify', 'rc:/tmp/taskrc']]:
+            self.assertRaises(InvalidRequest, check_command, args)
+
+    def test_commands(self):
+        tw = RemoteTaskWarrior(self.url)
+        self.assertEqual(tw.version, self.fake.version)
+        self.assertEqual(tw.execute_command(['count', 'Arena:bench']),
+                         [str(len(self.fake.data))])
+        self.assertRaises(tlib.TaskWarriorException, tw.execute_command,
+                          ['execute', 'true'])
+        self.assertRaises(tlib.TaskWarriorException, RemoteTaskWarrior(
+            self.url + 'x').execute_command, ['count'])
+        self.assertEqual(len(connection_pool.idle.values()), 1)
+        self.assertEqual(len(list(connection_pool.idle.values())[0]), 1)
+
+    def test_sync(self):
+        self.arena.remote_data = self.url
+        self.assertIsInstance(self.arena.tw_remote.tw, RemoteTaskWarrior)
+        sm = SyncManager(self.arena, IOManager(False), interactive=False)
+        self.assertTrue(sm.sync(True))
+        imports = [c for c in self.fake.commands if c[0] == 'import']
+        self.assertEqual(len(imports), 1)
+        entries, cursor = self.arena.tw_remote.change_log().since()
+        self.assertEqual(len(entries), len(
+            [e for e in sm.synclist if e.action == 'UPLOAD']))
+        self.assertEqual(self.arena.change_cursor, cursor)
+        local = sorted(t['description']
+                       for t in self.arena.get_local_tasks(records=True))
+        remote = sorted(t['description']
+                        for t in self.arena.get_remote_tasks(records=True))
+        self.assertEqual(local, remote)
+        sm.sync(True)
+        self.assertFalse(sm.synclist)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import unittest
+import sys
+import threading
+import time
+
+import tasklib.task as tlib
+from tarenalib.runner import (CommandRunner, CommandTimeout, CommandCanceled,
+                              RunnerTaskWarrior, command_runner)
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+class TestCommandRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CommandRunner(concurrency=2)
+
+    def test_run(self):
+        self.assertEqual(
+            self.runner.run(python('import sys; print(sys.stdin.read()); '
+                                   'sys.exit(3)'), input=b'y'),
+            ('y\n', '', 3))
+
+    def test_timeout(self):
+        start = time.monotonic()
+        self.assertRaises(CommandTimeout, self.runner.run,
+                          python('import time; time.sleep(10)'), timeout=0.2)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_concurrency(self):
+        sleep = python('import time; time.sleep(0.3)')
+        start = time.monotonic()
+        self.runner.run_all([(sleep, 'a', None), (sleep, 'b', None),
+                             (sleep, 'a', None)])
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.runner.concurrency = 1
+        start = time.monotonic()
+        self.runner.run_all([(sleep, 'c', None), (sleep, 'c', None)])
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+    def test_cancel(self):
+        errors = []
+
+        def run():
+            try:
+                self.runner.run(python('import time; time.sleep(10)'))
+            except CommandCanceled as err:
+                errors.append(err)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        while not self.runner.futures:
+            time.sleep(0.01)
+        self.runner.cancel()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+
+
+class TestRunnerTaskWarrior(unittest.TestCase):
+
+    def setUp(self):
+        self.tw = RunnerTaskWarrior.__new__(RunnerTaskWarrior)
+        self.tw.config = {'data.location': '/tmp'}
+
+    def tearDown(self):
+        command_runner.timeout = None
+
+    def test_execute_command(self):
+        self.tw._get_command_args = lambda args, config_override: python(
+            'import sys; print(" ".join(sys.argv[1:]))') + args
+        self.assertEqual(self.tw.execute_command(['a', 'b']), ['a b'])
+        self.tw._get_command_args = lambda args, config_override: python(
+            'import sys; sys.exit("failed")')
+        self.assertRaisesRegex(tlib.TaskWarriorException, 'failed',
+                               self.tw.execute_command, ['a'])
+        command_runner.timeout = 0.2
+        self.tw._get_command_args = lambda args, config_override: python(
+            'import time; time.sleep(10)')
+        self.assertRaisesRegex(tlib.TaskWarriorException, 'timed out',
+                               self.tw.execute_command, ['a'])
@@ -22,12 +22,17 @@ import unittest
 from unittest.mock import patch
 import tasklib.task as tlib
 
-from tarenalib.sync import SyncElement, SyncManager, SyncIOManager
-from tarenalib.arena import SharedTask, TaskArena
+from tarenalib.sync import SyncElement, SyncManager, SyncIOManager, \
+    DataLocationLocks, sync_arenas
+from tarenalib.arena import TaskEmperor
+from tarenalib.arena import SharedTask, TaskArena, EnhancedTaskWarrior, \
+    TaskRecord
 from tarenalib.io import IOManager
+from tarenalib.bench.generate import generate_arena
 
 from io import StringIO
 import sys
+import threading
 
 
 def last_modified_mock():
@@ -41,9 +46,13 @@ class TestSyncManager(unittest.TestCase):
     def setUp(self):
         self.patcher1 = patch('tasklib.task.TaskWarrior')
         self.MockClass1 = self.patcher1.start()
+        self.runner_patcher = patch('tarenalib.arena.RunnerTaskWarrior',
+                                    new=self.MockClass1)
+        self.runner_patcher.start()
 
     def tearDown(self):
         self.patcher1.stop()
+        self.runner_patcher.stop()
 
     def create_shared_task(self, arena, description):
         shared_task = SharedTask(tlib.Task(tlib.TaskWarrior()))
@@ -70,6 +79,23 @@ class TestSyncManager(unittest.TestCase):
         self.assertEqual(num_downloads, 1)
         self.assertEqual(num_conflicts, 1)
 
+    def test_create_synclist_order(self):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        ltasks = [self.create_shared_task(arena, 'l' + str(i)) for i in range(4)]
+        rtasks = [self.create_shared_task(arena, 'r' + str(i)) for i in range(4)]
+        for i, task in enumerate(ltasks):
+            task.ArenaTaskID = i
+        for i, task in enumerate(rtasks):
+            task.ArenaTaskID = 2 * i
+        sm = SyncManager(arena, IOManager(False))
+        sm.generate_synclist(ltasks, rtasks)
+        self.assertEqual([e.suggestion for e in sm.synclist],
+                         ['CONFLICT', 'UPLOAD', 'CONFLICT', 'UPLOAD',
+                          'DOWNLOAD', 'DOWNLOAD'])
+        self.assertEqual(sm.synclist[2].remote_task, rtasks[1])
+        self.assertEqual([e.remote_task for e in sm.synclist[4:]],
+                         rtasks[2:])
+
     @patch.object(SharedTask, 'last_modified', side_effect=last_modified_mock)
     def test_suggest_conflict_resolution(self, mock_last_modified):
         arena = TaskArena('my_arena', 'local', 'remote')
@@ -124,6 +150,191 @@ class TestSyncManager(unittest.TestCase):
         self.assertEqual(synclist[2].local_task.tw_task['priority'],
                          synclist[2].remote_task.tw_task['priority'])
 
+    @patch.object(EnhancedTaskWarrior, 'import_tasks')
+    @patch.object(SharedTask, 'save')
+    def test_carry_out_batch_sync(self, mock_save, mock_import):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        ltask1 = self.create_shared_task(arena, 'paint walls')
+        ltask2 = self.create_shared_task(arena, 'clean floor')
+        rtask1 = self.create_shared_task(arena, 'paint ceilling')
+        synclist = [SyncElement(ltask1, None, None, None, 'UPLOAD'),
+                    SyncElement(ltask2, None, None, None, 'UPLOAD'),
+                    SyncElement(None, rtask1, None, None, 'DOWNLOAD'),
+                    SyncElement(None, rtask1, None, None, 'SKIP')]
+        sm = SyncManager(arena, IOManager(False), batch=True)
+        sm.synclist = synclist
+        sm.carry_out_sync()
+        self.assertEqual(mock_import.call_count, 2)
+        self.assertEqual(len(mock_import.call_args_list[0][0][0]), 2)
+        self.assertEqual(len(mock_import.call_args_list[1][0][0]), 1)
+        self.assertEqual(synclist[2].local_task, rtask1)
+        self.assertIsNone(synclist[3].local_task)
+        self.assertFalse(mock_save.called)
+
+    def test_carry_out_batch_sync_failure(self):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        ltask1 = self.create_shared_task(arena, 'paint walls')
+        ltask2 = self.create_shared_task(arena, 'clean floor')
+        synclist = [SyncElement(ltask1, None, None, None, 'UPLOAD'),
+                    SyncElement(ltask2, None, None, None, 'UPLOAD')]
+
+        def import_tasks(tasks):
+            if len(tasks) > 1 or tasks[0].tw_task['description'] == 'clean floor':
+                raise tlib.TaskWarriorException('broken')
+
+        sm = SyncManager(arena, IOManager(False), batch=True)
+        sm.synclist = synclist
+        with patch.object(EnhancedTaskWarrior, 'import_tasks',
+                          side_effect=import_tasks):
+            sm.carry_out_sync()
+        self.assertIsNone(synclist[0].error)
+        self.assertEqual(synclist[1].error, 'broken')
+
+
+    def test_export_tasks(self):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        ltask1 = self.create_shared_task(arena, 'paint walls')
+        ltask2 = self.create_shared_task(arena, 'clean floor')
+        rtask1 = self.create_shared_task(arena, 'paint walls')
+        rtask2 = self.create_shared_task(arena, 'clean floor')
+        ltask1.ArenaTaskID = rtask1.ArenaTaskID = 1
+        ltask2.ArenaTaskID = rtask2.ArenaTaskID = 2
+        arena.get_local_tasks = lambda pattern=[], records=False: \
+            [ltask1] if pattern else [ltask1, ltask2]
+        arena.get_remote_tasks = lambda pattern=[], records=False: \
+            [rtask2] if pattern else [rtask1, rtask2]
+        arena.get_local_tasks_by_ids = lambda ids, records=False: \
+            [t for t in [ltask1, ltask2] if t.ArenaTaskID in ids]
+        arena.get_remote_tasks_by_ids = lambda ids, records=False: \
+            [t for t in [rtask1, rtask2] if t.ArenaTaskID in ids]
+        sm = SyncManager(arena, IOManager(False))
+        self.assertEqual(sm.export_tasks(), ([ltask1, ltask2], [rtask1, rtask2]))
+        arena.last_sync = '20151010T120000Z'
+        self.assertEqual(sm.export_tasks(), ([ltask1, ltask2], [rtask2, rtask1]))
+
+    def test_export_both_sides(self):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        sm = SyncManager(arena, IOManager(False))
+        barrier = threading.Barrier(2, timeout=5)
+        result = sm.export_both_sides(lambda: barrier.wait() * 0 + 1,
+                                      lambda: barrier.wait() * 0 + 2)
+        self.assertEqual(result, (1, 2))
+        self.assertGreaterEqual(sm.export_times['local'], 0)
+        self.assertGreaterEqual(sm.export_times['remote'], 0)
+
+    @patch('builtins.input', return_value='a')
+    def test_sync_watermark(self, mock_input):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        arena.get_local_tasks = lambda pattern=[], records=False: []
+        arena.get_remote_tasks = lambda pattern=[], records=False: []
+        sm = SyncManager(arena, IOManager(False))
+        self.assertTrue(sm.sync())
+        self.assertIsNotNone(arena.last_sync)
+        ltask = self.create_shared_task(arena, 'paint walls')
+        arena.get_local_tasks = lambda pattern=[], records=False: [ltask]
+        arena.last_sync = None
+        sm.carry_out_sync = lambda: None
+        with patch('builtins.input', return_value='c'):
+            self.assertFalse(sm.sync())
+        self.assertIsNone(arena.last_sync)
+
+    def test_watermark(self):
+        self.assertLess(TaskArena.watermark(), TaskArena.timestamp())
+
+    def test_accept_suggestions(self):
+        arena = TaskArena('my_arena', 'local', 'remote')
+        ltask = self.create_shared_task(arena, 'paint walls')
+        sm = SyncManager(arena, IOManager(False), interactive=False)
+        sm.synclist = [SyncElement(ltask, None, None, 'UPLOAD')]
+        sm.carry_out_sync = lambda: None
+        self.assertTrue(sm.process_user_modified_synclist())
+        self.assertEqual(sm.synclist[0].action, 'UPLOAD')
+
+    def test_sync_arenas(self):
+        te = TaskEmperor()
+        te.create_arena('a', 'local', 'remote')
+        te.create_arena('b', 'local', 'remote2')
+        te.create_arena('c', 'local', 'remote3')
+
+        def sync(sm, full=False):
+            if sm.arena.name == 'c':
+                raise tlib.TaskWarriorException('broken')
+            return sm.arena.name == 'a'
+
+        with patch.object(SyncManager, 'sync', new=sync):
+            self.assertEqual(sync_arenas(te, IOManager(False), 2), ['a'])
+
+
+class TestChunkedSync(unittest.TestCase):
+
+    def setUp(self):
+        self.arena = generate_arena(300, change_rate=0.1, conflict_rate=0.05,
+                                    new_rate=0.1)
+        self.sm = SyncManager(self.arena, IOManager(False), batch=True,
+                              interactive=False, chunk_size=50)
+        self.chunks = self.sm.prefix_chunks()
+
+    def exports(self):
+        return [c for c in self.arena.tw_local.tw.commands
+                if c[0] == 'export' and
+                any(a.startswith('ArenaTaskID.startswith:') for a in c)]
+
+    def test_complete(self):
+        self.assertTrue(self.sm.sync())
+        self.assertIsNone(self.arena.sync_cursor)
+        self.assertIsNotNone(self.arena.last_sync)
+        self.sm.sync()
+        self.assertFalse(self.sm.synclist)
+
+    def test_resume(self):
+        cursor = {'started': '20151010T100000Z',
+                  'prefix': self.chunks[3][-1], 'changes': None}
+        self.arena.sync_cursor = dict(cursor)
+        del self.arena.tw_local.tw.commands[:]
+        self.assertTrue(self.sm.sync())
+        self.assertEqual(len(self.exports()), len(self.chunks) - 4)
+        self.assertIsNone(self.arena.sync_cursor)
+        self.assertEqual(self.arena.last_sync, cursor['started'])
+
+    def test_cancel(self):
+        self.sm.interactive = True
+        calls = []
+
+        def user_checks_synclist(synclist, arena_name):
+            calls.append(True)
+            if len(calls) == 2:
+                return []
+            return self.sm.siom.accept_suggestions(synclist, arena_name)
+        self.sm.siom.user_checks_synclist = user_checks_synclist
+        self.assertFalse(self.sm.sync())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.arena.sync_cursor['prefix'],
+                         self.chunks[0][-1])
+        self.assertIsNone(self.arena.last_sync)
+
+    def test_other_ids(self):
+        tw = self.arena.tw_remote.tw
+        tw.add_data({'Arena': self.arena.name, 'ArenaTaskID': 'legacy-1',
+                     'description': 'legacy task'})
+        chunks = self.sm.prefix_chunks()
+        self.assertEqual(chunks[:-1], self.chunks)
+        self.assertEqual(chunks[-1], [SyncManager.other_prefix])
+        self.assertTrue(self.sm.sync())
+        self.assertIn('legacy-1', [t.ArenaTaskID for t in
+                                   self.arena.get_local_tasks()])
+
+
+class TestDataLocationLocks(unittest.TestCase):
+
+    def test_acquire_release(self):
+        locks = DataLocationLocks()
+        acquired = locks.acquire('local', './local', 'remote', None)
+        self.assertEqual(len(acquired), 2)
+        self.assertTrue(locks.get('local')[1].locked())
+        locks.release(acquired)
+        self.assertFalse(locks.get('local')[1].locked())
+        self.assertFalse(locks.get('remote')[1].locked())
+
 
 class TestSyncElement(unittest.TestCase):
 
@@ -179,6 +390,30 @@ class TestSyncIOManager(unittest.TestCase):
         synclist = [SyncElement()]
         self.assertEqual(siom.sync_preview(synclist), 'y')
 
+    @patch.object(IOManager, 'get_input', new=lambda a, b: 'y')
+    def test_sync_preview_summary(self):
+        siom = SyncIOManager(IOManager(), preview_limit=1)
+        synclist = [
+            SyncElement(TaskRecord({'description': 'paint walls',
+                                    'project': 'home'}), None, None,
+                        'UPLOAD'),
+            SyncElement(TaskRecord({'description': 'clean floor'}),
+                        TaskRecord({'description': 'clean floors'}),
+                        ['description'], 'DOWNLOAD'),
+            SyncElement(None, TaskRecord({'description': 'do dishes',
+                                          'project': 'home'}), None,
+                        'DOWNLOAD')]
+        with patch('sys.stdout.write') as write:
+            self.assertEqual(siom.sync_preview(synclist), 'y')
+        self.assertEqual(write.call_count, 1)
+        output = write.call_args[0][0]
+        self.assertIn('Suggestion: DOWNLOAD 2, UPLOAD 1', output)
+        self.assertIn('Project:    home 2, (none) 1', output)
+        self.assertIn('Field:      description 1', output)
+        self.assertIn('paint walls', output)
+        self.assertNotIn('clean floor', output)
+        self.assertIn('... and 2 more tasks.', output)
+
     @patch('builtins.input', side_effect=['u', 'd', 's'])
     @patch('tasklib.task.TaskWarrior')
     def test_sync_choice(self, mock_input, mock_warrior):
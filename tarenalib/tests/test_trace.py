@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+from io import StringIO
+from unittest.mock import patch
+import json
+
+from tarenalib.trace import Tracer
+from tarenalib.bench.fake import FakeTaskWarrior
+from tarenalib.bench.generate import generate_arena
+from tarenalib.io import IOManager
+from tarenalib.sync import SyncManager
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_span(self):
+        tracer = Tracer()
+        with tracer.span('export', arena='foo'):
+            pass
+        self.assertEqual(len(tracer.spans), 1)
+        self.assertEqual(tracer.spans[0]['name'], 'export')
+        self.assertEqual(tracer.spans[0]['arena'], 'foo')
+        self.assertGreaterEqual(tracer.spans[0]['seconds'], 0)
+
+    def test_disabled(self):
+        tracer = Tracer(enabled=False)
+        with tracer.span('export'):
+            pass
+        tracer.count('elements.UPLOAD')
+        self.assertEqual(tracer.json, {'spans': [], 'counters': {}})
+
+    def test_instrument(self):
+        tracer = Tracer()
+        tw = FakeTaskWarrior('/data')
+        tracer.instrument(tw)
+        tracer.instrument(tw)
+        tw.execute_command(['export', '--', 'Arena:foo'])
+        self.assertEqual(len(tracer.spans), 1)
+        self.assertEqual(tracer.spans[0]['name'], 'task export')
+        self.assertEqual(tracer.spans[0]['data_location'], '/data')
+
+    @patch('builtins.input', return_value='a')
+    def test_sync(self, mock_input):
+        tracer = Tracer()
+        arena = generate_arena(20, change_rate=0.5)
+        sm = SyncManager(arena, IOManager(False), tracer=tracer)
+        sm.sync()
+        names = [span['name'] for span in tracer.spans]
+        for phase in ['export', 'export local', 'export remote',
+                      'generate_synclist', 'suggest_conflict_resolution',
+                      'sync_preview', 'carry_out_sync', 'task export']:
+            self.assertIn(phase, names)
+        self.assertEqual(sum(tracer.counters.values()), len(sm.synclist))
+        f = StringIO()
+        tracer.save(f)
+        self.assertEqual(json.loads(f.getvalue()), tracer.json)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from tarenalib.arena import TaskArena
+from tarenalib.io import IOManager
+from tarenalib.watch import InotifyWatcher, PollingWatcher, WatchLoop
+
+
+class FakeSyncManager(object):
+
+    def __init__(self, arena):
+        self.arena = arena
+        self.synclist = []
+        self.runs = 0
+        self.fail = False
+
+    def sync(self):
+        self.runs += 1
+        if self.fail:
+            raise IOError('remote not reachable')
+        return True
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.locations = []
+        for name in ['local', 'remote', 'other']:
+            path = os.path.join(self.directory, name)
+            os.mkdir(path)
+            self.locations.append(path)
+        local, remote, other = self.locations
+        self.arenas = [TaskArena('foo', local, remote),
+                       TaskArena('bar', other, remote)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def touch(self, location, data_file='pending.data'):
+        with open(os.path.join(location, data_file), 'a') as f:
+            f.write('[description:"paint walls"]\n')
+
+    def test_watchers(self):
+        watchers = [PollingWatcher()]
+        try:
+            watchers.append(InotifyWatcher())
+        except OSError:
+            pass
+        for watcher in watchers:
+            for location in self.locations:
+                watcher.add(location)
+            self.touch(self.locations[1])
+            self.touch(self.locations[2], 'pending.data.tmp')
+            if isinstance(watcher, PollingWatcher):
+                changed = watcher.poll()
+            else:
+                changed = watcher.wait(1.0)
+            self.assertEqual(changed, set([self.locations[1]]))
+            watcher.close()
+
+    def test_remote_data_is_polled(self):
+        loop = WatchLoop(self.arenas, FakeSyncManager, IOManager(False),
+                         inotify=True)
+        local, remote, other = self.locations
+        self.assertIn(remote, loop.polling.functions)
+        if loop.inotify:
+            self.assertEqual(set(loop.inotify.locations.values()),
+                             set([local, other]))
+            self.assertNotIn(local, loop.polling.functions)
+            loop.inotify.close()
+
+    def test_loop(self):
+        clock = Clock()
+        loop = WatchLoop(self.arenas, FakeSyncManager, IOManager(False),
+                         debounce=2.0, min_interval=10.0, backoff=5.0,
+                         max_backoff=12.0, poll_interval=0.01,
+                         inotify=False, clock=clock)
+        foo, bar = [loop.sync_managers[name] for name in ['foo', 'bar']]
+        loop.step(0)
+        self.assertEqual((foo.runs, bar.runs), (1, 1))
+        self.assertEqual(loop.pending(), [])
+        self.touch(self.locations[0])
+        loop.wait(0.1)
+        self.assertEqual(loop.pending(), [self.arenas[0]])
+        clock.now += 1
+        loop.step(0)
+        self.assertEqual(foo.runs, 1)
+        clock.now += 10
+        loop.step(0)
+        self.assertEqual((foo.runs, bar.runs), (2, 1))
+        foo.fail = bar.fail = True
+        self.touch(self.locations[1])
+        loop.wait(0.1)
+        clock.now += 20
+        loop.step(0)
+        self.assertEqual((foo.runs, bar.runs), (3, 2))
+        self.assertEqual(loop.states['foo'].retry_at, clock.now + 5)
+        clock.now += 20
+        loop.step(0)
+        self.assertEqual(loop.states['foo'].retry_at, clock.now + 10)
+        clock.now += 20
+        loop.step(0)
+        self.assertEqual(loop.states['foo'].retry_at, clock.now + 12)
+        foo.fail = False
+        clock.now += 20
+        loop.step(0)
+        self.assertEqual(loop.states['foo'].failures, 0)
+        self.assertNotIn(self.arenas[0], loop.pending())
+        self.assertIn(self.arenas[1], loop.pending())
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer(object):
+    """ Records timed spans and counters of a sync. A disabled tracer
+        records nothing.
+    """
+
+    def __init__(self, enabled=True, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self.origin = clock()
+        self.spans = []
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if not self.enabled:
+            yield
+            return
+        start = self.clock()
+        try:
+            yield
+        finally:
+            span = {'name': name,
+                    'start': round(start - self.origin, 6),
+                    'seconds': round(self.clock() - start, 6),
+                    'thread': threading.current_thread().name}
+            span.update(attrs)
+            with self.lock:
+                self.spans.append(span)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def instrument(self, tw):
+        """ Records a span for every command executed by the TaskWarrior tw.
+            Instrumenting tw again replaces the previous instrumentation.
+        """
+        if not self.enabled:
+            return
+        execute_command = type(tw).execute_command
+        data_location = tw.config.get('data.location')
+
+        def traced_command(args, *a, **kw):
+            args = [str(arg) for arg in args]
+            command = next((arg for arg in args
+                            if arg in ['add', 'count', 'export', 'import',
+                                       'modify', 'config']), args[0])
+            with self.span('task ' + command, data_location=data_location):
+                return execute_command(tw, args, *a, **kw)
+
+        tw.execute_command = traced_command
+
+    def get_json(self):
+        return {'spans': self.spans, 'counters': self.counters}
+
+    json = property(get_json)
+
+    def save(self, f):
+        json.dump(self.json, f, indent=2)
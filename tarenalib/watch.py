@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+
+# TaskArena - Adding collaborative functionality to TaskWarrior
+# Copyright (C) 2015  Nikolai Nowaczyk
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from tarenalib.index import data_signature
+from tarenalib.remote import is_remote
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+event_header = struct.Struct('iIII')
+
+
+class InotifyWatcher(object):
+    """ Watches the data files of local data locations with inotify. Raises
+        OSError if inotify is not available.
+    """
+
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        try:
+            self.add_watch = libc.inotify_add_watch
+            self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        except AttributeError:
+            raise OSError('inotify is not available')
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.locations = {}
+
+    def add(self, data_location):
+        wd = self.add_watch(self.fd, os.fsencode(data_location), self.mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(),
+                          'Cannot watch ' + data_location)
+        self.locations[wd] = data_location
+
+    def wait(self, timeout):
+        """ Returns the data locations whose data files changed within
+            timeout seconds, waiting only until the first change.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        buffer = os.read(self.fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = event_header.unpack_from(buffer,
+                                                                offset)
+            offset += event_header.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name.endswith(b'.data') and wd in self.locations:
+                changed.add(self.locations[wd])
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(object):
+    """ Detects changes of data locations by comparing their signatures,
+        the mtimes and sizes of the data files of local data locations and
+        the end of the change log of data locations served by
+        ``tarena serve``.
+    """
+
+    def __init__(self):
+        self.signatures = {}
+        self.functions = {}
+
+    def add(self, data_location, signature=None):
+        if signature is None:
+            signature = lambda: data_signature(data_location)
+        self.functions[data_location] = signature
+        self.signatures[data_location] = signature()
+
+    def poll(self):
+        changed = set()
+        for data_location, signature in self.functions.items():
+            current = signature()
+            if current != self.signatures[data_location]:
+                self.signatures[data_location] = current
+                changed.add(data_location)
+        return changed
+
+    def close(self):
+        pass
+
+
+class ArenaState(object):
+
+    __slots__ = ['changed', 'last_run', 'failures', 'retry_at']
+
+    def __init__(self):
+        self.changed = float('-inf')
+        self.last_run = float('-inf')
+        self.failures = 0
+        self.retry_at = float('-inf')
+
+
+class WatchLoop(object):
+    """ Syncs arenas whenever the data files of their local or remote data
+        locations change. A sync starts once no change happened for debounce
+        seconds, at most once every min_interval seconds per arena. After a
+        failed sync the arena waits backoff seconds, doubled after every
+        further failure up to max_backoff. Only local data locations are
+        watched with inotify, which does not see writes of other hosts to
+        shared folders, so remote data locations and data locations that
+        inotify cannot watch are polled every poll_interval seconds.
+
+        sync_manager returns the SyncManager of an arena, which is kept
+        between syncs along with its TaskWarriors. Every arena is synced
+        once on start.
+    """
+
+    def __init__(self, arenas, sync_manager, io_manager, debounce=2.0,
+                 min_interval=10.0, backoff=5.0, max_backoff=300.0,
+                 poll_interval=5.0, inotify=True, on_sync=None,
+                 clock=time.monotonic):
+        self.arenas = arenas
+        self.iom = io_manager
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.on_sync = on_sync
+        self.clock = clock
+        self.stopped = False
+        self.sync_managers = {arena.name: sync_manager(arena)
+                              for arena in arenas}
+        self.states = {arena.name: ArenaState() for arena in arenas}
+        self.arenas_of = {}
+        for arena in arenas:
+            for data_location in [arena.local_data, arena.remote_data]:
+                self.arenas_of.setdefault(data_location, []).append(arena)
+        self.inotify = None
+        self.polling = PollingWatcher()
+        if inotify:
+            try:
+                self.inotify = InotifyWatcher()
+            except OSError:
+                pass
+        for data_location in list(self.arenas_of):
+            self.watch(data_location)
+
+    def watch(self, data_location):
+        if is_remote(data_location):
+            tw_remote = self.arenas_of[data_location][0].tw_remote
+            self.polling.add(data_location,
+                             lambda: tw_remote.change_log().end())
+            return
+        path = os.path.expanduser(data_location)
+        self.arenas_of[path] = self.arenas_of[data_location]
+        is_local = all(arena.local_data == data_location
+                       for arena in self.arenas_of[data_location])
+        if self.inotify and is_local:
+            try:
+                self.inotify.add(path)
+                return
+            except OSError:
+                pass
+        self.polling.add(path)
+
+    def due(self, state):
+        """ Returns the time at which the arena may be synced next. """
+        return max(state.changed + self.debounce,
+                   state.last_run + self.min_interval, state.retry_at)
+
+    def pending(self):
+        return [arena for arena in self.arenas
+                if self.states[arena.name].changed is not None]
+
+    def sync(self, arena):
+        state = self.states[arena.name]
+        state.changed = None
+        state.last_run = self.clock()
+        sm = self.sync_managers[arena.name]
+        try:
+            sm.sync()
+            failed = any(e.error for e in sm.synclist or [])
+        except Exception as err:
+            self.iom.send_message(
+                "Sync of arena " + arena.name + " failed: " + str(err))
+            failed = True
+        if failed:
+            state.failures += 1
+            state.changed = state.last_run
+            state.retry_at = self.clock() + min(
+                self.max_backoff, self.backoff * 2 ** (state.failures - 1))
+        else:
+            state.failures = 0
+            state.retry_at = float('-inf')
+        if self.on_sync:
+            self.on_sync(arena)
+
+    def wait(self, timeout):
+        """ Waits up to timeout seconds, or until the next change if timeout
+            is None, and marks the arenas of all changed data locations.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changed = set()
+        while not changed and not self.stopped:
+            remaining = None if deadline is None else \
+                max(0.0, deadline - time.monotonic())
+            step = remaining
+            if self.polling.functions or not self.inotify:
+                step = self.poll_interval if remaining is None else \
+                    min(remaining, self.poll_interval)
+            if self.inotify:
+                changed |= self.inotify.wait(step)
+            else:
+                time.sleep(step)
+            changed |= self.polling.poll()
+            if remaining is not None and remaining <= step:
+                break
+        now = self.clock()
+        for data_location in changed:
+            for arena in self.arenas_of.get(data_location, []):
+                self.states[arena.name].changed = now
+
+    def step(self, timeout=None):
+        """ Syncs all arenas that are due and waits for the next change, but
+            no longer than timeout seconds.
+        """
+        now = self.clock()
+        for arena in self.pending():
+            if self.due(self.states[arena.name]) <= now:
+                self.sync(arena)
+        due = [max(0.0, self.due(self.states[arena.name]) - self.clock())
+               for arena in self.pending()]
+        if timeout is not None:
+            due.append(timeout)
+        self.wait(min(due) if due else None)
+
+    def run(self):
+        try:
+            while not self.stopped:
+                self.step()
+        finally:
+            if self.inotify:
+                self.inotify.close()
+
+    def stop(self):
+        self.stopped = True